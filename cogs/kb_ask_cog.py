@@ -2,14 +2,13 @@ import discord
 import os
 import time
 import random
-import hashlib
 import datetime
 from discord.ext import commands
 from discord.commands import option
 from dotenv import load_dotenv
 
-from utils import gsheet_utils
-from utils.ask_utils import categorize_question, load_specified_ask_sheet, load_all_ask_sheets, get_responses_for_role, get_substring_response
+from utils import google_async
+from utils.ask_utils import choose_answer, find_special_responses
 
 REFRESH_ASK_COOLDOWN_SECONDS = 60
 
@@ -32,7 +31,7 @@ class AskCog(commands.Cog):
         ]
         username = ctx.author.name   # This is the real username, not display/nickname
         roles = [role.name for role in ctx.author.roles]
-        responses = get_responses_for_role(self.sheet_name, roles, "hello", username=username)
+        responses = await google_async.get_responses_for_role(self.sheet_name, roles, "hello", username=username)
         if not responses:
             response = random.choice(defaultResponses)
         else:
@@ -52,9 +51,9 @@ class AskCog(commands.Cog):
 
             if time_since_last > REFRESH_ASK_COOLDOWN_SECONDS:
                 if cache_name.lower().strip() == "all":
-                    load_all_ask_sheets(self.sheet_name)
+                    await google_async.load_all_ask_sheets(self.sheet_name)
                 else:
-                    load_specified_ask_sheet(self.sheet_name, cache_name.lower(), force=True)
+                    await google_async.load_ask_sheet(self.sheet_name, cache_name.lower(), force=True)
                 self.refresh_ask_cooldown = now
                 await ctx.respond(f"📝 Refreshed {cache_name} cache!")
             else:
@@ -77,37 +76,31 @@ class AskCog(commands.Cog):
             role_names = [role.name for role in ctx.author.roles]
 
             # Special response
-            special_responses = load_specified_ask_sheet(self.sheet_name, "specials")
-            if special_responses and question.strip() in special_responses:
-                response = special_responses[question.strip()][0].replace("{user}", display_name)
+            special_responses = find_special_responses(
+                await google_async.load_ask_sheet(self.sheet_name, "specials"), question
+            )
+            if special_responses:
+                response = special_responses[0].replace("{user}", display_name)
                 await ctx.respond(f"**{display_name} asks**: {question}\n**Kringbot says**: {response}")
                 return
 
             # Role-specific response
-            response = get_substring_response(self.sheet_name, ctx.author.name, role_names, question)
+            response = await google_async.get_substring_response(self.sheet_name, ctx.author.name, role_names, question)
             if response:
                 response = response.replace("{user}", display_name)
                 await ctx.respond(f"**{display_name} asks**: {question}\n**Kringbot says**: {response}")
                 return
 
-            category_keywords = load_specified_ask_sheet(self.sheet_name, "categories")
-            responses_by_category = load_specified_ask_sheet(self.sheet_name, "responses")
+            category_keywords = await google_async.load_ask_sheet(self.sheet_name, "categories")
+            responses_by_category = await google_async.load_ask_sheet(self.sheet_name, "responses")
             if not category_keywords or not responses_by_category:
                 await ctx.respond("⚠️ UmU I couldn't load my response data. Try `/refresh-ask` or contact the dev.")
                 return
 
-            category = categorize_question(question, category_keywords)
-            responses = responses_by_category.get(category, responses_by_category["general"])
-
             now = datetime.datetime.now(datetime.UTC)
             minutes = (now.minute // 3) * 3
             time_key = now.strftime(f"%Y-%m-%d %H:{minutes:02d}")
-            hash_input = f"{question}_{time_key}"
-            seed = int(hashlib.sha256(hash_input.encode("utf-8")).hexdigest(), 16)
-
-            random.seed(seed)
-            response = random.choice(responses)
-            random.seed()
+            response = choose_answer(question, time_key, category_keywords, responses_by_category)
 
             response = response.replace("{user}", display_name)
             await ctx.respond(f"**{display_name} asks**: {question}\n**Kringbot says**: {response}")
@@ -121,7 +114,7 @@ class AskCog(commands.Cog):
     async def show_ask_cache(self, ctx: discord.ApplicationContext, cache_name: str):
         try:
             await ctx.defer(ephemeral=True)
-            cache = load_specified_ask_sheet(self.sheet_name, cache_name.lower())
+            cache = await google_async.load_ask_sheet(self.sheet_name, cache_name.lower())
             print(f"{cache_name}: {cache}")
             await ctx.respond("✅ Cache printed to console.")
         except discord.errors.NotFound:
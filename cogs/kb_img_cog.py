@@ -3,7 +3,7 @@ import time
 import os
 from discord.ext import commands
 from discord.commands import slash_command
-from utils import gimg_utils, bot_prefs
+from utils import bot_prefs, google_async
 
 REFRESH_IMG_COOLDOWN_SECONDS = 300
 DAILY_COOLDOWN_SECONDS = 60 * 60 * 12
@@ -32,7 +32,7 @@ class ImgCog(commands.Cog):
                 await ctx.respond(f"⏳ A refresh was done recently! Try again in {minutes}m {seconds}s.")
                 return
 
-            success = gimg_utils.refresh_folder_cache(self.img_folder_name)
+            success = await google_async.refresh_folder_cache(self.img_folder_name)
 
             if success:
                 self.refresh_img_cooldown = now
@@ -49,9 +49,9 @@ class ImgCog(commands.Cog):
         try:
             await ctx.defer()
             user_id = ctx.author.id
-            no_cd = bot_prefs.get(f"no_cd_daily_{user_id}", False)
+            no_cd = bot_prefs.get_in("no_cd_daily", user_id, False)
             if not no_cd:
-                remaining = int(bot_prefs.get(f"daily_img_cd_{user_id}", 0))
+                remaining = int(bot_prefs.get_in("daily_img_cd", user_id, 0))
                 if remaining > 0:
                     hours = remaining // 3600
                     minutes = (remaining % 3600) // 60
@@ -59,13 +59,13 @@ class ImgCog(commands.Cog):
                     await ctx.respond(f"⏳ You've already received your image of the day! Try again in {hours}h {minutes}m {seconds}s.")
                     return
 
-            image_url = gimg_utils.get_random_image_url(self.img_folder_name)
+            image_url = await google_async.get_random_image_url(self.img_folder_name)
             if not image_url:
                 await ctx.respond("⚠️ UmU Could not find images in the daily folder. Try contacting the dev.")
                 return
             # Set cooldown for this user
             if not no_cd:
-                bot_prefs.set(f"daily_img_cd_{user_id}", DAILY_COOLDOWN_SECONDS, time_based=True)
+                bot_prefs.set_in("daily_img_cd", user_id, DAILY_COOLDOWN_SECONDS, time_based=True)
             embed = discord.Embed(title=f"🖼️ Here's your image of the day, {ctx.author.display_name}!")
             embed.set_image(url=image_url)
 
@@ -80,8 +80,8 @@ class ImgCog(commands.Cog):
         try:
             await ctx.defer()
             user_id = ctx.author.id
-            no_cd = bot_prefs.get(f"no_cd_kringpic_{user_id}", False)
-            remaining = int(bot_prefs.get(f"kringpic_img_cd_{user_id}", 0))
+            no_cd = bot_prefs.get_in("no_cd_kringpic", user_id, False)
+            remaining = int(bot_prefs.get_in("kringpic_img_cd", user_id, 0))
             if not no_cd:
                 if remaining > 0:
                     minutes = (remaining % 3600) // 60
@@ -89,13 +89,13 @@ class ImgCog(commands.Cog):
                     await ctx.respond(f"⏳ You've recently requested a kringpic! Try again in {minutes}m {seconds}s.")
                     return
 
-            image_url = gimg_utils.get_random_image_url(self.img_folder_name)
+            image_url = await google_async.get_random_image_url(self.img_folder_name)
             if not image_url:
                 await ctx.respond("⚠️ UmU Could not find images in the images folder. Try contacting the dev.")
                 return
             # Set cooldown for this user
             if not no_cd: 
-                bot_prefs.set(f"kringpic_img_cd_{user_id}", KRINGPIC_COOLDOWN_SECONDS, time_based=True)
+                bot_prefs.set_in("kringpic_img_cd", user_id, KRINGPIC_COOLDOWN_SECONDS, time_based=True)
             embed = discord.Embed(title=f"🖼️ Here's a kring pic, {ctx.author.display_name}!")
             embed.set_image(url=image_url)
 
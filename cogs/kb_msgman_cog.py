@@ -238,7 +238,7 @@ class MessageManager(commands.Cog):
             for content, channel, sent_at, deleted_at in msgs:
                 all_deleted.append((uid, content, channel, sent_at, deleted_at))
 
-        bot_prefs.set(f"{guild_id}_deleted", all_deleted)
+        bot_prefs.set_in("deleted", guild_id, all_deleted)
 
         # Edited messages (no change)
         all_edits = []
@@ -252,15 +252,15 @@ class MessageManager(commands.Cog):
                     entry["edits"]
                 ))
 
-        bot_prefs.set(f"{guild_id}_edited", all_edits)
+        bot_prefs.set_in("edited", guild_id, all_edits)
 
     def _restore_logs_from_prefs(self, guild: discord.Guild):
         gid = guild.id
 
-        deleted = bot_prefs.get(f"{gid}_deleted", [])
+        deleted = bot_prefs.get_in("deleted", gid, [])
         for uid, content, channel, sent_ts, deleted_ts in deleted:
             self.recent_deletes[uid].append((content, channel, sent_ts, deleted_ts))
-        edited = bot_prefs.get(f"{gid}_edited", [])
+        edited = bot_prefs.get_in("edited", gid, [])
         for uid, msg_id, channel, original, edits in edited:
             self.recent_edits[uid].append({
                 "message_id": msg_id,
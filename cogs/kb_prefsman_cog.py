@@ -1,40 +1,118 @@
 import discord
+import asyncio
 import atexit
-from discord.ext import commands
-from utils import bot_prefs, drive_prefs
+import os
+from concurrent.futures import ThreadPoolExecutor
+from discord.ext import commands, tasks
+from utils import bot_prefs, drive_prefs, google_async
 
 LOCAL_PREF_PATH = "kringbot_prefs.json"
+CHECKPOINT_INTERVAL_SECONDS = int(os.environ.get("PREFS_CHECKPOINT_SECONDS", 300))
+
+# Content hash of the snapshot Drive currently holds, so unchanged prefs aren't re-uploaded
+_uploaded_hash = None
 
 def _save_prefs():
+    global _uploaded_hash
     if not bot_prefs.all_keys():
         print("[PrefsManager] 💤 No prefs to save — skipping Drive upload.")
         return
-    
+
     bot_prefs.save(LOCAL_PREF_PATH)
+    digest = bot_prefs.saved_hash(LOCAL_PREF_PATH)
+    if digest is None or digest == _uploaded_hash:
+        print("[PrefsManager] 💤 Prefs unchanged since last upload — skipping Drive upload.")
+        return
+
     drive_prefs.upload_to_drive(LOCAL_PREF_PATH)
+    _uploaded_hash = digest
     print("[PrefsManager] 🧷 Saved prefs via atexit.")
 
+def _write_and_upload(snapshot):
+    """Runs in the checkpoint executor: write the snapshot file, then push it to Drive."""
+    global _uploaded_hash
+    if snapshot is not None:
+        bot_prefs.write_snapshot(snapshot)
+    digest = bot_prefs.saved_hash(LOCAL_PREF_PATH)
+    if digest is None or digest == _uploaded_hash:
+        return
+    drive_prefs.upload_to_drive(LOCAL_PREF_PATH)
+    _uploaded_hash = digest
+    print("[PrefsManager] 🧷 Checkpointed prefs to Drive.")
+
 atexit.register(_save_prefs)
 
 class PrefsManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # One worker: at most one write/upload in flight, later requests coalesce behind it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefs-checkpoint")
+        self._checkpoint_running = False
+        self._checkpoint_pending = False
+        self.checkpoint_loop.change_interval(seconds=CHECKPOINT_INTERVAL_SECONDS)
+
+    def cog_unload(self):
+        self.checkpoint_loop.cancel()
+        self._executor.shutdown(wait=True)
+
+    def set_checkpoint_interval(self, seconds: float):
+        self.checkpoint_loop.change_interval(seconds=seconds)
+
+    async def request_checkpoint(self):
+        """Snapshot prefs on the event loop, then write + upload off it. Calls made mid-upload are coalesced."""
+        if self._checkpoint_running:
+            self._checkpoint_pending = True
+            return
+
+        self._checkpoint_running = True
+        try:
+            loop = asyncio.get_running_loop()
+            while True:
+                self._checkpoint_pending = False
+                bot_prefs.expire_due()
+                snapshot = bot_prefs.take_snapshot(LOCAL_PREF_PATH)
+                try:
+                    await loop.run_in_executor(self._executor, _write_and_upload, snapshot)
+                except Exception as e:
+                    print(f"[PrefsManager] ❌ Checkpoint failed: {e}")
+                if not self._checkpoint_pending:
+                    break
+        finally:
+            self._checkpoint_running = False
+
+    @tasks.loop(seconds=300)
+    async def checkpoint_loop(self):
+        await self.request_checkpoint()
 
     @commands.Cog.listener()
     async def on_ready(self):
+        global _uploaded_hash
+        # A SQLite backend keeps its own state across restarts; only migrate from Drive when it's empty
+        if bot_prefs.has_durable_state():
+            print(f"[PrefsManager] 💾 Using local {bot_prefs.backend_name()} prefs store.")
+        # The local snapshot + journal is never older than the Drive copy (uploads are made from it),
+        # and after a crash the journal holds writes Drive never saw, so it wins over a download
+        elif bot_prefs.has_local_state(LOCAL_PREF_PATH):
+            print("[PrefsManager] 💾 Recovering prefs from the local snapshot and journal.")
+            bot_prefs.load(LOCAL_PREF_PATH)
         # Load from Drive on first ready
-        if drive_prefs.download_from_drive(LOCAL_PREF_PATH):
+        elif await google_async.download_prefs(LOCAL_PREF_PATH):
             bot_prefs.load(LOCAL_PREF_PATH)
+            _uploaded_hash = bot_prefs.saved_hash(LOCAL_PREF_PATH)
         else:
             print("[PrefsManager] ⚠️ No cloud prefs found. Starting fresh.")
+            bot_prefs.open_journal(LOCAL_PREF_PATH)
+
+        if not self.checkpoint_loop.is_running():
+            self.checkpoint_loop.start()
 
     @commands.Cog.listener()
     async def on_disconnect(self):
-        _save_prefs()
+        await self.request_checkpoint()
 
     @commands.Cog.listener()
     async def on_close(self):
-        _save_prefs()
+        await self.request_checkpoint()
 
     # @discord.slash_command(name="save-db", escription="Save current bot prefs to Drive")
     # async def save_db(self, ctx):
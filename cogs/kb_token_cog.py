@@ -17,38 +17,45 @@ class TokenCog(commands.Cog):
 
     def get_balance(self, user_id: int) -> int:
         """Returns how many tokens the user currently has."""
-        return int(bot_prefs.get(f"ktoken_balance_{user_id}", 0))
+        return int(bot_prefs.get_in("ktoken_balance", user_id, 0))
     
     def set_balance(self, user_id: int, new_balance: int):
         """Set the user's new token balance."""
-        bot_prefs.set(f"ktoken_balance_{user_id}", max(new_balance, 0))
+        bot_prefs.set_in("ktoken_balance", user_id, max(new_balance, 0))
+
+    def add_balance(self, user_id: int, delta: int) -> int:
+        """Atomically add delta (may be negative) to the user's balance, flooring at 0. Returns the new balance."""
+        return int(bot_prefs.incr_in("ktoken_balance", user_id, delta, minimum=0, clamp=True))
+
+    def try_spend(self, user_id: int, amount: int):
+        """Atomically deduct amount if the user can afford it. Returns the new balance, or None if they can't."""
+        new_balance = bot_prefs.incr_in("ktoken_balance", user_id, -amount, minimum=0)
+        return None if new_balance is None else int(new_balance)
     
     def get_claim_cooldown_remaining(self, user_id: int) -> int:
         """Returns how many seconds remain before user can claim again."""
-        return int(bot_prefs.get(f"ktoken_claim_cd_{user_id}", 0))
+        return int(bot_prefs.get_in("ktoken_claim_cd", user_id, 0))
 
     def set_claim_cooldown(self, user_id: int, seconds: int):
         """Sets the claim cooldown for a user to 'seconds' time-based."""
-        bot_prefs.set(f"ktoken_claim_cd_{user_id}", seconds, time_based=True)
+        bot_prefs.set_in("ktoken_claim_cd", user_id, seconds, time_based=True)
 
     def modify_cooldown(self, cooldown_type: str, target_id: int, delta_seconds: int):
         """
         Modify a user's daily or kringpic cooldown by +/- delta_seconds.
         If negative, it reduces. If positive, it adds.
         """
-        # The image cogs store daily cooldown in "daily_img_cd_{user_id}"
-        # and kring pic in "kringpic_img_cd_{user_id}"
+        # The image cogs store daily cooldown in the "daily_img_cd" namespace
+        # and kring pic in "kringpic_img_cd"
         if cooldown_type == "daily":
-            key = f"daily_img_cd_{target_id}"
+            namespace = "daily_img_cd"
         elif cooldown_type == "claim":
-            key = f"ktoken_claim_cd_{target_id}"
+            namespace = "ktoken_claim_cd"
         else:
             return False  # Unknown type
 
-        current = bot_prefs.get(key, 0)  # how many seconds remain
-        new_val = max(0, current + delta_seconds)  # can't go below 0
-        # Re-save as time-based so it counts down
-        bot_prefs.set(key, new_val, time_based=True)
+        # Add to the seconds remaining (can't go below 0) and re-save as time-based so it counts down
+        bot_prefs.incr_in(namespace, target_id, delta_seconds, minimum=0, clamp=True, time_based=True)
         return True
     
     ktokengrp = SlashCommandGroup("ktoken", "Base slash command for ktoken commands.")
@@ -65,7 +72,17 @@ class TokenCog(commands.Cog):
     async def claim(self, ctx: discord.ApplicationContext):
         """Users can claim one token if they're past their cooldown."""
         user_id = ctx.author.id
-        remaining = self.get_claim_cooldown_remaining(user_id)
+        cd_key = bot_prefs.key_for("ktoken_claim_cd", user_id)
+        balance_key = bot_prefs.key_for("ktoken_balance", user_id)
+
+        # Check the cooldown, award and restart the cooldown as one step so double-clicks can't claim twice
+        with bot_prefs.transaction(cd_key, balance_key) as tx:
+            remaining = int(tx.get(cd_key, 0))
+            if remaining <= 0:
+                balance = int(tx.get(balance_key, 0)) + 3600
+                tx.set(balance_key, balance)
+                tx.set(cd_key, CLAIM_COOLDOWN, time_based=True)
+
         if remaining > 0:
             # Show the user how long until they can claim again
             hours = remaining // 3600
@@ -76,13 +93,7 @@ class TokenCog(commands.Cog):
                 ephemeral=True
             )
 
-        # Award 1 token
-        balance = self.get_balance(user_id)
-        self.set_balance(user_id, balance + 3600)
-        # Set claim cooldown
-        self.set_claim_cooldown(user_id, CLAIM_COOLDOWN)
-
-        await ctx.respond(f"✅ You have claimed 1 ktoken! Your new balance: {balance+1}", ephemeral=True)
+        await ctx.respond(f"✅ You have claimed 1 ktoken! Your new balance: {balance}", ephemeral=True)
 
     @ktokengrp.command(name="balance", description="Check your token balance")
     async def balance(self, ctx: discord.ApplicationContext):
@@ -110,9 +121,10 @@ class TokenCog(commands.Cog):
         """
         user_id = ctx.author.id
 
-        # 1) Check user has enough tokens
-        current_balance = self.get_balance(user_id)
-        if current_balance < tokens:
+        # 1) Deduct tokens from the spender, if they have enough
+        new_balance = self.try_spend(user_id, tokens)
+        if new_balance is None:
+            current_balance = self.get_balance(user_id)
             return await ctx.respond(
                 f"❌ You only have {current_balance} tokens, but that requires {tokens}.",
                 ephemeral=True
@@ -125,13 +137,11 @@ class TokenCog(commands.Cog):
             seconds = -seconds
 
         # 3) Modify target's cooldown
-        success = self.modify_image_cooldown(cooldown, target.id, seconds)
+        success = self.modify_cooldown(cooldown, target.id, seconds)
         if not success:
+            self.add_balance(user_id, tokens)  # refund
             return await ctx.respond("❌ Unknown cooldown type.", ephemeral=True)
 
-        # 4) Deduct tokens from the spender
-        self.set_balance(user_id, current_balance - tokens)
-
         # 5) Notify
         if mode == "reduce":
             verb = "reduced"
@@ -143,7 +153,7 @@ class TokenCog(commands.Cog):
         await ctx.respond(
             f"✅ {ctx.author.display_name} has {verb} **{target.display_name}**'s **{cooldown}** cooldown.\n"
             f"**Cooldown change:** {delta_str}\n"
-            f"**{ctx.author.display_name} current balance:** {current_balance - tokens}"
+            f"**{ctx.author.display_name} current balance:** {new_balance}"
         )
         
     @ktokengrp_owner.command(
@@ -157,13 +167,8 @@ class TokenCog(commands.Cog):
         tokens: Option(int, description="number of tokens to add/remove"),
     ):
         user_id = target.id
-        current_balance = self.get_balance(user_id)
-        new_balance = current_balance + tokens
         # prevent negative final balance
-        if new_balance < 0:
-            new_balance = 0
-
-        self.set_balance(user_id, new_balance)
+        new_balance = self.add_balance(user_id, tokens)
 
         # Decide how you want to phrase it
         verb = "increased" if tokens >= 0 else "decreased"
@@ -192,8 +197,9 @@ class TokenCog(commands.Cog):
            If an exact number guess is correct, user wins +2×bet (1:2).
         """
         user_id = ctx.author.id
-        current_balance = self.get_balance(user_id)
-        if bet > current_balance:
+        # Deduct the bet up front, so open games can never stake more than the balance
+        if self.try_spend(user_id, bet) is None:
+            current_balance = self.get_balance(user_id)
             return await ctx.respond(
                 f"❌ You only have {current_balance} tokens, but you tried to bet {bet}.",
                 ephemeral=True
@@ -219,24 +225,22 @@ class TokenCog(commands.Cog):
     #####################
     @ktokengrp.command(name="blackjack", description="Play blackjack with ktokens!")
     async def blackjack(
-    self,
-    ctx: discord.ApplicationContext,
-    bet: Option(int, description="How many tokens to bet", min_value=1)
+        self,
+        ctx: discord.ApplicationContext,
+        bet: Option(int, description="How many tokens to bet", min_value=1)
     ):
-    user_id = ctx.author.id
-    current_balance = self.get_balance(user_id)
-    if bet > current_balance:
-        return await ctx.respond(
-            f"❌ You only have {current_balance} tokens, but you tried to bet {bet}.",
-            ephemeral=True
-        )
-
-    # Deduct the bet up front
-    self.set_balance(user_id, current_balance - bet)
+        user_id = ctx.author.id
+        # Deduct the bet up front
+        if self.try_spend(user_id, bet) is None:
+            current_balance = self.get_balance(user_id)
+            return await ctx.respond(
+                f"❌ You only have {current_balance} tokens, but you tried to bet {bet}.",
+                ephemeral=True
+            )
 
-    # Start the blackjack game
-    view = BlackjackView(self, ctx.author, bet)
-    await view.start(ctx)
+        # Start the blackjack game
+        view = BlackjackView(self, ctx.author, bet)
+        await view.start(ctx)
 
 
 class DiceBetView(discord.ui.View):
@@ -262,6 +266,10 @@ class DiceBetView(discord.ui.View):
         return True
 
     async def on_timeout(self):
+        # The stake was taken when the game opened, so give it back if no guess was made
+        if not self.chosen:
+            self.chosen = True
+            self.token_cog.add_balance(self.user_id, self.bet_amount)
         # disable buttons if time runs out
         for child in self.children:
             if isinstance(child, discord.ui.Button):
@@ -280,19 +288,18 @@ class DiceBetView(discord.ui.View):
 
     async def do_roll(self, guess: str) -> str:
         roll = random.randint(1, 6)
-        old_balance = self.token_cog.get_balance(self.user_id)
-        # default payout is 0 => user loses bet
-        new_balance = max(0, old_balance - self.bet_amount)
+        # default payout is 0 => user loses bet, which was already taken when the game opened
+        delta = -self.bet_amount
         outcome_str = ""
 
         # Check if guess is "higher" or "lower"
         if guess == "higher" and roll in (4,5,6):
             # 1:1 payout => user gains +bet
-            new_balance = old_balance + self.bet_amount
+            delta = self.bet_amount
             outcome_str = f"**WIN** +{self.bet_amount}"
 
         elif guess == "lower" and roll in (1,2,3):
-            new_balance = old_balance + self.bet_amount
+            delta = self.bet_amount
             outcome_str = f"**WIN** +{self.bet_amount}"
 
         # Or if guess is a single digit
@@ -300,12 +307,16 @@ class DiceBetView(discord.ui.View):
             chosen_num = int(guess)
             if roll == chosen_num:
                 # 1:2 payout => user gains +2×bet
-                new_balance = old_balance + (self.bet_amount * 5)
+                delta = self.bet_amount * 5
                 outcome_str = f"**WIN** +{self.bet_amount * 5}"
 
-        # Then finalize
-        self.token_cog.set_balance(self.user_id, new_balance)
-        net_change = new_balance - old_balance
+        # Then finalize: a win pays back the stake plus winnings
+        if delta > 0:
+            new_balance = self.token_cog.add_balance(self.user_id, self.bet_amount + delta)
+        else:
+            new_balance = self.token_cog.get_balance(self.user_id)
+        old_balance = new_balance - delta  # balance before the bet was placed
+        net_change = delta
 
         # Format text
         if net_change >= 0:
@@ -468,7 +479,7 @@ class BlackjackView(discord.ui.View):
             result = f"❌ Dealer wins. You lost {self.bet} tokens."
 
         # Update balance
-        self.token_cog.set_balance(self.player.id, self.token_cog.get_balance(self.player.id) + payout)
+        self.token_cog.add_balance(self.player.id, payout)
 
         embed = self.build_embed(reveal_dealer=True)
         embed.add_field(name="Result", value=result, inline=False)
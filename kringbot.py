@@ -7,6 +7,11 @@ from discord.commands import option
 load_dotenv()
 from utils import gsheet_utils, gimg_utils, bot_prefs
 
+# Serve the last known sheet and image data right away; both reconcile with Google in the background
+gsheet_utils.warm_start()
+gimg_utils.warm_start()
+gimg_utils.start_change_poller()
+
 # allows for instant testing of functions within specified guilds
 GUILD_IDS = [int(os.getenv("GUILD_ID_1")), int(os.getenv("GUILD_ID_2"))]
 intents = discord.Intents.default()
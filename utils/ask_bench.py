@@ -0,0 +1,159 @@
+"""
+Offline benchmark / regression check for /ask categorization.
+
+    python -m utils.ask_bench SHEET_DIR CORPUS [--matcher rules|ngrams|tfidf]
+                              [--compare-matcher NAME] [--compare-sheet OTHER_SHEET_DIR] [--show N]
+
+SHEET_DIR holds an export of the ask sheet, one CSV per tab with the header row included
+(categories.csv, responses.csv, role_ask_responses.csv, ...), the same layout
+utils/local_storage.py serves. CORPUS is a text file of logged questions, one per line; a line
+may also be "username<TAB>role1,role2<TAB>question" to exercise the role substring rules.
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+from collections import Counter
+from utils import ask_utils, gsheet_utils
+
+MATCHERS = {
+    "rules": ask_utils.categorize_question,
+    "ngrams": ask_utils.categorize_question_ngrams,
+    "tfidf": lambda question, category_keywords: ask_utils.categorize(question, category_keywords, engine="tfidf"),
+}
+
+def load_sheet_export(sheet_dir: str) -> dict:
+    """tab name → parsed table, for every ask tab present in the export."""
+    tables = {}
+    for tab_name, (num_key_columns, num_value_columns) in ask_utils._sheet_specs.items():
+        path = os.path.join(sheet_dir, f"{tab_name}.csv")
+        if not os.path.exists(path):
+            tables[tab_name] = {}
+            continue
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        tables[tab_name] = gsheet_utils._parse_table(rows[1:], num_key_columns, num_value_columns)  # Skip the header row.
+    return tables
+
+def load_corpus(path: str) -> list:
+    """[(username, roles, question)], questions lowercased the way /ask sees them."""
+    corpus = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            parts = line.split("\t")
+            if len(parts) >= 3:
+                username, roles, question = parts[0], [r for r in parts[1].split(",") if r], "\t".join(parts[2:])
+            else:
+                username, roles, question = "", [], line
+            corpus.append((username, roles, question.lower()))
+    return corpus
+
+def _percentile(sorted_values: list, fraction: float):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def run(tables: dict, corpus: list, matcher: str) -> dict:
+    """Categorize + substring-match every question, timing each one."""
+    categorize = MATCHERS[matcher]
+    category_keywords = tables["categories"]
+    role_rules = tables["role_ask_responses"]
+
+    # Compiled matchers are built once per table in the bot too, so keep that out of the per-question numbers
+    build_start = time.perf_counter()
+    if category_keywords:
+        categorize("", category_keywords)
+    ask_utils.find_substring_responses(role_rules, "", [], "")
+    build_seconds = time.perf_counter() - build_start
+
+    categories, latencies = [], []
+    substring_hits = 0
+    start = time.perf_counter()
+    for username, roles, question in corpus:
+        t0 = time.perf_counter_ns()
+        if ask_utils.find_substring_responses(role_rules, username, roles, question) is not None:
+            substring_hits += 1
+        categories.append(categorize(question, category_keywords) if category_keywords else "general")
+        latencies.append(time.perf_counter_ns() - t0)
+    total_seconds = time.perf_counter() - start
+
+    return {
+        "matcher": matcher,
+        "build_seconds": build_seconds,
+        "total_seconds": total_seconds,
+        "latencies": sorted(latencies),
+        "categories": categories,
+        "substring_hits": substring_hits,
+    }
+
+def print_report(result: dict, tables: dict, label: str):
+    count = len(result["categories"])
+    latencies = result["latencies"]
+    print(f"=== {label} (matcher: {result['matcher']}) ===")
+    print(f"Questions      : {count}")
+    print(f"Matcher build  : {result['build_seconds'] * 1000:.2f} ms")
+    print(f"Throughput     : {count / result['total_seconds']:.0f} questions/s" if result["total_seconds"] else "Throughput     : n/a")
+    print("Latency (µs)   : " + "  ".join(
+        f"p{int(p * 100)}={_percentile(latencies, p) / 1000:.1f}" for p in (0.5, 0.9, 0.99)
+    ) + f"  max={(latencies[-1] if latencies else 0) / 1000:.1f}")
+    print(f"Substring hits : {result['substring_hits']} ({100 * result['substring_hits'] / max(count, 1):.1f}%)")
+
+    responses = tables.get("responses") or {}
+    print("Categories     :")
+    for category, n in Counter(result["categories"]).most_common():
+        missing = "" if category in responses else "  (no responses row → falls back to general)"
+        print(f"  {category:<20} {n:>8}  {100 * n / max(count, 1):5.1f}%{missing}")
+    print()
+
+def print_diff(corpus: list, before: dict, after: dict, show: int):
+    changed = [
+        (question, a, b)
+        for (_, _, question), a, b in zip(corpus, before["categories"], after["categories"])
+        if a != b
+    ]
+    print(f"=== Diff: {len(changed)} of {len(corpus)} questions changed category ===")
+    for (a, b), n in Counter((a, b) for _, a, b in changed).most_common():
+        print(f"  {a} → {b}: {n}")
+    for question, a, b in changed[:show]:
+        print(f"  [{a} → {b}] {question}")
+    print()
+    return len(changed)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark /ask categorization against a corpus of questions.")
+    parser.add_argument("sheet_dir", help="directory with the exported ask tabs as CSV")
+    parser.add_argument("corpus", help="text file of questions, one per line")
+    parser.add_argument("--matcher", choices=MATCHERS, default="rules")
+    parser.add_argument("--compare-matcher", choices=MATCHERS, help="diff against another matcher on the same sheet")
+    parser.add_argument("--compare-sheet", help="diff against another export of the sheet, same matcher")
+    parser.add_argument("--show", type=int, default=20, help="changed questions to list in a diff")
+    args = parser.parse_args(argv)
+    if "tfidf" in (args.matcher, args.compare_matcher) and ask_utils.np is None:
+        # categorize() would quietly fall back to the rules, and the report would claim otherwise
+        parser.error("the tfidf matcher needs numpy, which isn't installed")
+
+    tables = load_sheet_export(args.sheet_dir)
+    corpus = load_corpus(args.corpus)
+    result = run(tables, corpus, args.matcher)
+    print_report(result, tables, args.sheet_dir)
+
+    changed = 0
+    if args.compare_matcher:
+        other = run(tables, corpus, args.compare_matcher)
+        print_report(other, tables, args.sheet_dir)
+        changed += print_diff(corpus, result, other, args.show)
+    if args.compare_sheet:
+        other_tables = load_sheet_export(args.compare_sheet)
+        other = run(other_tables, corpus, args.matcher)
+        print_report(other, other_tables, args.compare_sheet)
+        changed += print_diff(corpus, result, other, args.show)
+
+    # Non-zero exit when a comparison changed anything, so it can gate a sheet or matcher change
+    return 1 if changed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
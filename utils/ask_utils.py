@@ -1,7 +1,21 @@
 from utils import gsheet_utils                # For try_get_from_cache
-from collections import defaultdict  # For default dictionary structure
+from utils.text_match import Automaton        # Compiled keyword / substring matching
+from collections import defaultdict, OrderedDict  # For default dictionary structure / LRU
 import os
 import random
+import hashlib
+import unicodedata
+
+try:
+    import numpy as np  # optional: only needed for the "tfidf" categorizer
+except ImportError:
+    np = None
+
+ANSWER_CACHE_SIZE = 2048  # memoized /ask answers, see choose_answer
+# "rules" (exact keyword phrases) or "tfidf" (similarity scoring, falling back to the rules when unsure)
+CATEGORIZER = os.environ.get("ASK_CATEGORIZER", "rules").strip().lower()
+TFIDF_MIN_CONFIDENCE = float(os.environ.get("ASK_TFIDF_MIN_CONFIDENCE", 0.3))
+TFIDF_MAX_NGRAM = 2
 
 def generate_ngrams(tokens, n):
     """
@@ -11,9 +25,10 @@ def generate_ngrams(tokens, n):
     """
     return [" ".join(tokens[i:i+n]) for i in range(len(tokens) - n + 1)]
 
-def categorize_question(question: str, category_keywords: dict) -> str:
+def categorize_question_ngrams(question: str, category_keywords: dict) -> str:
     """
     Categorize the user's question using an n‑gram approach.
+    Reference implementation: categorize_question gives the same answer through a compiled matcher.
 
     :param question: The user’s question string (e.g., "When will I sleep?")
     :param category_keywords: A dictionary mapping categories to lists of keywords,
@@ -80,20 +95,195 @@ def categorize_question(question: str, category_keywords: dict) -> str:
     # Safety fallback, shouldn't reach here
     return list(category_keywords.keys())[-1]
 
+class CategoryMatcher:
+    """
+    The categories tab compiled into a word-level Aho-Corasick automaton. Scores match
+    categorize_question_ngrams: each distinct keyword phrase found in the question adds its
+    word count to every category listing it (once per listing), ties go to the earliest category.
+    """
+    def __init__(self, category_keywords: dict):
+        self.categories = list(category_keywords)
+        phrase_ids = {}      # keyword words → phrase ID
+        self.phrase_hits = []  # phrase ID → [(category index, weight)], one entry per listing
+        for index, keywords in enumerate(category_keywords.values()):
+            for kw in keywords:
+                normalized_kw = kw.lower()
+                words = tuple(normalized_kw.split())
+                # n-grams are single-space joined, so a keyword with other spacing can never match
+                if not words or " ".join(words) != normalized_kw:
+                    continue
+                if words not in phrase_ids:
+                    phrase_ids[words] = len(self.phrase_hits)
+                    self.phrase_hits.append([])
+                self.phrase_hits[phrase_ids[words]].append((index, len(words)))
+        self.automaton = Automaton(phrase_ids.items())
+
+    def scores(self, question: str) -> list:
+        scores = [0] * len(self.categories)
+        for phrase_id in self.automaton.matched(question.lower().split()):
+            for index, weight in self.phrase_hits[phrase_id]:
+                scores[index] += weight
+        return scores
+
+    def categorize(self, question: str) -> str:
+        scores = self.scores(question)
+        best_score = max(scores)
+        if best_score == 0:
+            return "general"
+        return self.categories[scores.index(best_score)]  # first in dictionary order wins ties
+
+_compiled = {}  # builder → (table it was built from, what it built)
+
+def _compiled_for(table: dict, build):
+    """build(table), rebuilt only when the sheet cache hands out a new table object."""
+    source, compiled = _compiled.get(build, (None, None))
+    if source is not table:
+        compiled = build(table)
+        _compiled[build] = (table, compiled)
+    return compiled
+
+def compile_categories(category_keywords: dict) -> CategoryMatcher:
+    return _compiled_for(category_keywords, CategoryMatcher)
+
+def categorize_question(question: str, category_keywords: dict) -> str:
+    """Categorize the user's question; same result as categorize_question_ngrams, in one pass over its words."""
+    return compile_categories(category_keywords).categorize(question)
+
+def _tfidf_terms(text: str) -> list:
+    tokens = text.lower().split()
+    return [gram for n in range(1, TFIDF_MAX_NGRAM + 1) for gram in generate_ngrams(tokens, n)]
+
+class TfidfCategorizer:
+    """
+    Scores a question against every category at once: each category's keywords form one TF-IDF
+    document (words and word pairs), and a question is scored with one matrix-vector product of
+    cosine similarities. Below min_confidence the exact keyword rules decide instead.
+    """
+    def __init__(self, category_keywords: dict, min_confidence: float = TFIDF_MIN_CONFIDENCE):
+        if np is None:
+            raise RuntimeError("numpy is required for TF-IDF categorization")
+        self.category_keywords = category_keywords
+        self.categories = list(category_keywords)
+        self.min_confidence = min_confidence
+
+        documents = [[term for kw in keywords for term in _tfidf_terms(kw)] for keywords in category_keywords.values()]
+        self.vocabulary = {}
+        for terms in documents:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        counts = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, terms in enumerate(documents):
+            for term in terms:
+                counts[row, self.vocabulary[term]] += 1
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.matrix = self._normalize(counts * self.idf)
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def _vectorize(self, questions: list):
+        vectors = np.zeros((len(questions), len(self.vocabulary)), dtype=np.float32)
+        for row, question in enumerate(questions):
+            for term in _tfidf_terms(question):
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    vectors[row, column] += 1
+        return self._normalize(vectors * self.idf)
+
+    def scores(self, question: str):
+        """Cosine similarity of the question to each category, in category order."""
+        return self.matrix @ self._vectorize([question])[0]
+
+    def categorize(self, question: str) -> str:
+        return self.categorize_batch([question])[0]
+
+    def categorize_batch(self, questions: list) -> list:
+        """Categorize many questions with one matrix product; low-confidence ones go through the rules."""
+        if not questions:
+            return []
+        if not self.categories:
+            return [categorize_question(question, self.category_keywords) for question in questions]
+        similarities = self._vectorize(questions) @ self.matrix.T
+        best = similarities.argmax(axis=1)  # first category in dictionary order wins ties
+        confidence = similarities[np.arange(len(questions)), best]
+        return [
+            self.categories[index] if score >= self.min_confidence
+            else categorize_question(question, self.category_keywords)
+            for question, index, score in zip(questions, best.tolist(), confidence.tolist())
+        ]
+
+_warned_no_numpy = False
+
+def compile_tfidf(category_keywords: dict) -> TfidfCategorizer:
+    return _compiled_for(category_keywords, TfidfCategorizer)
+
+def _use_tfidf(engine: str = None) -> bool:
+    global _warned_no_numpy
+    if (engine or CATEGORIZER) != "tfidf":
+        return False
+    if np is None:
+        if not _warned_no_numpy:
+            print("[Ask] ⚠️ ASK_CATEGORIZER=tfidf needs numpy; using keyword rules.")
+            _warned_no_numpy = True
+        return False
+    return True
+
+def categorize(question: str, category_keywords: dict, engine: str = None) -> str:
+    """Categorize with the configured engine (ASK_CATEGORIZER), or the one named."""
+    if _use_tfidf(engine):
+        return compile_tfidf(category_keywords).categorize(question)
+    return categorize_question(question, category_keywords)
+
+def categorize_questions(questions: list, category_keywords: dict, engine: str = None) -> list:
+    """Batch version of categorize, e.g. for tuning keywords against a log of past questions."""
+    if _use_tfidf(engine):
+        return compile_tfidf(category_keywords).categorize_batch(list(questions))
+    matcher = compile_categories(category_keywords)
+    return [matcher.categorize(question) for question in questions]
+
+# tab name → (num_key_columns, num_value_columns)
+_sheet_specs = {
+    "categories": (1, None),
+    "responses": (1, None),
+    "specials": (1, None),
+    "role_ask_responses": (2, None),
+    "role_responses": (2, 1),
+}
+
+# tab name → seconds a cached copy stays fresh before it's refreshed in the background
+_sheet_ttls = {
+    "categories": 1800,
+    "responses": 300,
+    "specials": 300,
+    "role_ask_responses": 600,
+    "role_responses": 600,
+}
+
+def _load_tab(sheet_ask_name: str, tab_name: str, force=False):
+    num_key_columns, num_value_columns = _sheet_specs[tab_name]
+    return gsheet_utils.try_get_from_cache(sheet_ask_name, tab_name, num_key_columns=num_key_columns,
+                                           num_value_columns=num_value_columns, force=force,
+                                           ttl=_sheet_ttls[tab_name])
+
 def load_categories_from_sheet(sheet_ask_name : str, force=False):
-    return gsheet_utils.try_get_from_cache(sheet_ask_name, "categories", force=force)
+    return _load_tab(sheet_ask_name, "categories", force=force)
 
 def load_responses_from_sheet(sheet_ask_name : str, force=False):
-    return gsheet_utils.try_get_from_cache(sheet_ask_name, "responses", force=force)
+    return _load_tab(sheet_ask_name, "responses", force=force)
 
 def load_specials_from_sheet(sheet_ask_name : str, force=False):
-    return gsheet_utils.try_get_from_cache(sheet_ask_name, "specials", force=force)
+    return _load_tab(sheet_ask_name, "specials", force=force)
 
 def load_role_substring_responses(sheet_ask_name : str, force=False):
-    return gsheet_utils.try_get_from_cache(sheet_ask_name, "role_ask_responses", num_key_columns=2, force=force)
+    return _load_tab(sheet_ask_name, "role_ask_responses", force=force)
 
 def load_role_responses(sheet_ask_name : str, force=False):
-    return gsheet_utils.try_get_from_cache(sheet_ask_name, "role_responses", num_key_columns=2, num_value_columns=1, force=force)
+    return _load_tab(sheet_ask_name, "role_responses", force=force)
 
 _sheet_loaders = {
     "categories": load_categories_from_sheet,
@@ -108,25 +298,74 @@ def load_specified_ask_sheet(sheet_ask_name: str, key: str, force=False):
     return _sheet_loaders[key](sheet_ask_name, force=force)
 
 def load_all_ask_sheets(sheet_ask_name: str):
-    for key, loader_fn in _sheet_loaders.items():
-        loader_fn(sheet_ask_name, force=True)
-
-def get_substring_response(sheet_ask_name: str, username: str, roles: list[str], question: str):
-    role_substring_rules = load_role_substring_responses(sheet_ask_name)
-
-    # 1. Check user name as "role"
-    for (rule_role, substr), responses in role_substring_rules.items():
-        if rule_role == username and substr in question:
-            return random.choice(responses)
-
-    # 2. Fallback to actual roles
-    for role in roles:
+    # One batched fetch for every tab instead of a spreadsheet open + download per tab
+    gsheet_utils.load_tables(sheet_ask_name, _sheet_specs, ttls=_sheet_ttls)
+
+def normalize_question(text: str) -> str:
+    """Fold case and unicode look-alikes (NFKC), drop punctuation and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith("P"))
+    return " ".join(text.split())
+
+def _build_specials_index(specials: dict) -> dict:
+    index = {}  # normalized question → responses
+    for question, responses in specials.items():
+        if responses:
+            index.setdefault(normalize_question(question), responses)  # first row wins
+    return index
+
+def specials_index(specials: dict) -> dict:
+    return _compiled_for(specials, _build_specials_index)
+
+def find_special_responses(specials: dict, question: str):
+    """Responses for a special question: exact match first, then on the normalized form."""
+    if not specials:
+        return None
+    exact = specials.get(question.strip())
+    return exact or specials_index(specials).get(normalize_question(question))
+
+class RoleSubstringIndex:
+    """
+    The role_ask_responses tab grouped by role, each role's substrings compiled into one
+    character-level automaton. A role's first rule (in sheet order) found in the question wins.
+    """
+    def __init__(self, role_substring_rules: dict):
+        rules_by_role = defaultdict(list)
         for (rule_role, substr), responses in role_substring_rules.items():
-            if rule_role == role and substr in question:
-                return random.choice(responses)
+            rules_by_role[rule_role].append((substr, responses))
+
+        self.roles = {}  # role → (automaton over its substrings, [responses per rule])
+        for rule_role, rules in rules_by_role.items():
+            automaton = Automaton((substr, order) for order, (substr, _) in enumerate(rules))
+            self.roles[rule_role] = (automaton, [responses for _, responses in rules])
+
+    def responses_for(self, role: str, question: str):
+        """Responses of the role's first rule whose substring occurs in the question, or None."""
+        if role not in self.roles:
+            return None
+        automaton, responses = self.roles[role]
+        matched = automaton.matched(question)
+        return responses[min(matched)] if matched else None
+
+def compile_role_substring_rules(role_substring_rules: dict) -> RoleSubstringIndex:
+    return _compiled_for(role_substring_rules, RoleSubstringIndex)
+
+def find_substring_responses(role_substring_rules: dict, username: str, roles: list[str], question: str):
+    """Responses of the winning role substring rule for this member, or None."""
+    index = compile_role_substring_rules(role_substring_rules)
+
+    # 1. Check user name as "role", 2. fallback to actual roles, in order
+    for role in [username, *roles]:
+        responses = index.responses_for(role, question)
+        if responses is not None:
+            return responses
 
     return None
 
+def get_substring_response(sheet_ask_name: str, username: str, roles: list[str], question: str):
+    responses = find_substring_responses(load_role_substring_responses(sheet_ask_name), username, roles, question)
+    return random.choice(responses) if responses is not None else None
+
 def get_responses_for_role(sheet_ask_name: str, roles: list[str], key: str, username: str = None):
     role_responses = load_role_responses(sheet_ask_name)
 
@@ -144,9 +383,26 @@ def get_responses_for_role(sheet_ask_name: str, roles: list[str], key: str, user
 
     return None  # No match found
 
+_answer_cache = OrderedDict()  # (question, time bucket, sheet cache version) → chosen response
 
-
-
-
-
-
+def choose_answer(question: str, time_key: str, category_keywords: dict, responses_by_category: dict) -> str:
+    """
+    Categorize the question and pick its response, seeded by question + time bucket so everyone
+    asking the same thing in the same bucket gets the same answer. Uses its own Random rather
+    than reseeding the global one, and memoizes the result until the bucket or sheet data changes.
+    """
+    key = (question, time_key, gsheet_utils.get_cache_version())
+    response = _answer_cache.get(key)
+    if response is not None:
+        _answer_cache.move_to_end(key)
+        return response
+
+    category = categorize(question, category_keywords)
+    responses = responses_by_category.get(category, responses_by_category["general"])
+    seed = int(hashlib.sha256(f"{question}_{time_key}".encode("utf-8")).hexdigest(), 16)
+    response = random.Random(seed).choice(responses)
+
+    _answer_cache[key] = response
+    if len(_answer_cache) > ANSWER_CACHE_SIZE:
+        _answer_cache.popitem(last=False)
+    return response
@@ -1,20 +1,113 @@
-import json
 import time
 import os
+import threading
+from contextlib import contextmanager
+from utils.prefs_backends import KeySpace, MemoryBackend, SqliteBackend, JOURNAL_SUFFIX, content_hash, serialize_snapshot, write_snapshot_text
+
+# "memory" keeps everything in a dict (JSON snapshot + journal); "sqlite" keeps one row per key on disk.
+BACKEND_NAME = os.environ.get("BOT_PREFS_BACKEND", "memory").strip().lower()
+SQLITE_PATH = os.environ.get("BOT_PREFS_DB_PATH", "kringbot_prefs.db")
+EXPIRY_SWEEP_INTERVAL = 30  # seconds between opportunistic sweeps of elapsed time-based entries
+LOCK_STRIPES = 64           # read-modify-write ops lock one stripe per key instead of the whole store
+
+# Namespaces the cogs store per-subject values under, and the flat key format each one has always used.
+NAMESPACES = {
+    "daily_img_cd": "{ns}_{sid}",
+    "kringpic_img_cd": "{ns}_{sid}",
+    "no_cd_daily": "{ns}_{sid}",
+    "no_cd_kringpic": "{ns}_{sid}",
+    "ktoken_balance": "{ns}_{sid}",
+    "ktoken_claim_cd": "{ns}_{sid}",
+    "deleted": "{sid}_deleted",
+    "edited": "{sid}_edited",
+}
+keyspace = KeySpace(NAMESPACES)
+
+def _make_backend(name):
+    if name == "sqlite":
+        return SqliteBackend(SQLITE_PATH, keyspace)
+    if name != "memory":
+        print(f"[BotPrefs] ⚠️ Unknown backend '{name}', falling back to memory.")
+    return MemoryBackend(keyspace)
+
+# Dirty tracking: every mutation bumps the generation; saves remember what they last wrote per path
+_generation = 0
+_saved = {}  # filepath → (generation, content hash)
+# Held around every snapshot-file write, so a checkpoint can't land on top of a newer compaction
+_snapshot_lock = threading.RLock()
+
+def _compact_to(filepath):
+    """Compaction hook for journaled backends: rewrite the snapshot, truncate the journal, record it in _saved."""
+    with _snapshot_lock:
+        _touch()  # runs mid-write, before the caller's own _touch; the snapshot already holds that write
+        entries = _backend.live_entries()
+        _backend.save(filepath, entries)
+        _saved[filepath] = (_generation, content_hash(entries))
 
 # Internal store
-_store = {}
+_backend = _make_backend(BACKEND_NAME)
+_backend.compact_hook = _compact_to
+_expire_callbacks = []
+_last_sweep = 0
+_key_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
 
-### Singleton API ###
-def set(key, value, time_based=False):
-    _store[key] = {
+def use_backend(backend):
+    """Swap the storage backend (the previous one is closed)."""
+    global _backend
+    _backend.close()
+    backend.keyspace = keyspace
+    backend.compact_hook = _compact_to
+    backend.reindex()
+    _backend = backend
+    _touch()
+
+def backend_name():
+    return _backend.name
+
+def _touch():
+    global _generation
+    _generation += 1
+
+def generation():
+    """Mutation counter; changes whenever anything in the store may have changed."""
+    return _generation
+
+def is_dirty(filepath):
+    """True if the store may have changed since it was last saved to (or loaded from) filepath."""
+    saved = _saved.get(filepath)
+    return saved is None or saved[0] != _generation
+
+def _make_entry(value, time_based):
+    return {
         "value": value,
         "time_based": time_based,
         "saved_at": time.time() if time_based else None
     }
 
+@contextmanager
+def _locked(keys):
+    """Hold the stripe locks for the given keys, always acquired in stripe order to avoid deadlocks."""
+    stripes = sorted({hash(key) % LOCK_STRIPES for key in keys})
+    for stripe in stripes:
+        _key_locks[stripe].acquire()
+    try:
+        yield
+    finally:
+        for stripe in reversed(stripes):
+            _key_locks[stripe].release()
+
+### Singleton API ###
+def set(key, value, time_based=False):
+    _maybe_expire()
+    with _locked([key]):
+        _backend.put_entry(key, _make_entry(value, time_based))
+        _touch()
+
 def get(key, default=None):
-    entry = _store.get(key)
+    _maybe_expire()
+    return _entry_value(_backend.get_entry(key), default)
+
+def _entry_value(entry, default=None):
     if not entry:
         return default
 
@@ -27,55 +120,271 @@ def get(key, default=None):
     return value
 
 def has(key):
-    return key in _store
+    return _backend.has(key)
 
 def delete(key):
-    _store.pop(key, None)
+    with _locked([key]):
+        if _backend.delete(key):
+            _touch()
 
 def all_keys():
-    return list(_store.keys())
+    return _backend.keys()
+
+
+### Namespaced API ###
+def register_namespace(namespace, key_format="{ns}_{sid}"):
+    """Register a namespace and its flat key format, indexing any keys already stored under it."""
+    keyspace.register(namespace, key_format)
+    _backend.reindex()
+
+def key_for(namespace, subject_id):
+    if namespace not in keyspace:
+        register_namespace(namespace)
+    return keyspace.join(namespace, subject_id)
+
+def set_in(namespace, subject_id, value, time_based=False):
+    _maybe_expire()
+    key = key_for(namespace, subject_id)
+    with _locked([key]):
+        _backend.put_entry(key, _make_entry(value, time_based), ns=(namespace, subject_id))
+        _touch()
+
+def get_in(namespace, subject_id, default=None):
+    return get(key_for(namespace, subject_id), default)
+
+def has_in(namespace, subject_id):
+    return has(key_for(namespace, subject_id))
+
+def delete_in(namespace, subject_id):
+    delete(key_for(namespace, subject_id))
+
+def namespace_items(namespace):
+    """Return {subject_id: value} for every entry in a namespace (subject ids come back as strings)."""
+    return {sid: _entry_value(entry) for sid, entry in _backend.namespace_entries(namespace).items()}
+
+def subject_items(subject_id):
+    """Return {namespace: value} for every namespaced entry belonging to one subject."""
+    return {ns: _entry_value(entry) for ns, entry in _backend.subject_entries(subject_id).items()}
+
+
+def incr_in(namespace, subject_id, delta=1, **kwargs):
+    return incr(key_for(namespace, subject_id), delta, **kwargs)
+
+def compare_and_set_in(namespace, subject_id, expected, new_value, time_based=False):
+    return compare_and_set(key_for(namespace, subject_id), expected, new_value, time_based)
+
+
+### Atomic API ###
+def incr(key, delta=1, default=0, minimum=None, clamp=False, time_based=False):
+    """
+    Atomically add delta to a numeric value and return the new value.
+    If the result would drop below `minimum`, it is clamped to it when `clamp` is set,
+    otherwise nothing is written and None is returned.
+    """
+    _maybe_expire()
+    with _locked([key]):
+        new_value = get(key, default) + delta
+        if minimum is not None and new_value < minimum:
+            if not clamp:
+                return None
+            new_value = minimum
+        _backend.put_entry(key, _make_entry(new_value, time_based))
+        _touch()
+        return new_value
+
+def compare_and_set(key, expected, new_value, time_based=False):
+    """Atomically set key to new_value only if its current value equals expected. Returns True on success."""
+    _maybe_expire()
+    with _locked([key]):
+        if get(key) != expected:
+            return False
+        _backend.put_entry(key, _make_entry(new_value, time_based))
+        _touch()
+        return True
+
+class Transaction:
+    """Buffered reads/writes over a fixed set of keys, applied together when the `transaction` block exits."""
+    def __init__(self, keys):
+        self._keys = frozenset(keys)
+        self._writes = {}  # key → entry, or None for a delete
+
+    def _check(self, key):
+        if key not in self._keys:
+            raise KeyError(f"{key} was not declared in this transaction")
+
+    def get(self, key, default=None):
+        self._check(key)
+        if key in self._writes:
+            return _entry_value(self._writes[key], default)
+        return get(key, default)
+
+    def set(self, key, value, time_based=False):
+        self._check(key)
+        self._writes[key] = _make_entry(value, time_based)
+
+    def delete(self, key):
+        self._check(key)
+        self._writes[key] = None
+
+    def _ops(self):
+        return [("s", key, entry, None) if entry is not None else ("d", key) for key, entry in self._writes.items()]
+
+@contextmanager
+def transaction(*keys):
+    """
+    Lock the given keys and yield a Transaction; its writes are applied atomically on a clean exit
+    and discarded if the block raises.
+
+        with bot_prefs.transaction(a, b) as tx:
+            tx.set(a, tx.get(a, 0) - 5)
+            tx.set(b, tx.get(b, 0) + 5)
+    """
+    _maybe_expire()
+    with _locked(keys):
+        tx = Transaction(keys)
+        yield tx
+        if tx._writes:
+            _backend.apply_batch(tx._ops())
+            _touch()
+
+
+### Expiry ###
+def on_expire(callback):
+    """Register callback(key) to be called whenever an elapsed time-based entry is evicted."""
+    _expire_callbacks.append(callback)
+
+def expire_due():
+    """Evict every time-based entry whose countdown has reached 0. Returns the evicted keys."""
+    global _last_sweep
+    _last_sweep = time.time()
+    expired = _backend.expire_due(_last_sweep)
+    if expired:
+        _touch()
+    for key in expired:
+        for callback in _expire_callbacks:
+            try:
+                callback(key)
+            except Exception as e:
+                print(f"[BotPrefs] ❌ on_expire callback failed for {key}: {e}")
+    return expired
+
+def _maybe_expire():
+    if time.time() - _last_sweep >= EXPIRY_SWEEP_INTERVAL:
+        expire_due()
+
+
+### Journal ###
+def open_journal(filepath, truncate=True):
+    """Start journaling set/delete calls to <filepath>.log; the snapshot is written to filepath on compaction."""
+    _backend.open_journal(filepath, truncate=truncate)
+
+def close_journal():
+    _backend.close_journal()
+
+def compact():
+    """Fold the journal into the snapshot file and start a fresh journal."""
+    _backend.compact()
 
 
 ### Persistence API ###
-def save(filepath):
-    """Save to a JSON file."""
+def has_durable_state():
+    """True if the backend already holds state that survived a restart (e.g. a populated SQLite db)."""
+    return _backend.has_durable_state()
+
+def save(filepath, force=False):
+    """
+    Save to a JSON file. Saving to the journaled snapshot path also truncates the journal.
+    Skips the write when nothing changed since the last save to filepath; returns True if written.
+    """
+    saved = _saved.get(filepath)
+    unchanged_on_disk = not force and saved is not None and os.path.exists(filepath)
+    generation = _generation
+    if unchanged_on_disk and saved[0] == generation:
+        print(f"[BotPrefs] 💤 No changes since last save to {filepath}, skipping.")
+        return False
+
     try:
-        with open(filepath, "w") as f:
-            json.dump(_store, f, indent=2)
+        entries = _backend.live_entries()
+        digest = content_hash(entries)
+        if unchanged_on_disk and saved[1] == digest:
+            # Mutated, but back to what's already on disk (e.g. a value re-set to itself)
+            _saved[filepath] = (generation, digest)
+            print(f"[BotPrefs] 💤 Content unchanged since last save to {filepath}, skipping.")
+            return False
+
+        with _snapshot_lock:
+            _backend.save(filepath, entries)
+            _saved[filepath] = (generation, digest)
         print(f"[BotPrefs] ✅ Saved state to {filepath}")
+        return True
     except Exception as e:
         print(f"[BotPrefs] ❌ Failed to save: {e}")
+        return False
+
+class Snapshot:
+    """A serialized copy of the store, taken on the event loop and written out from anywhere."""
+    def __init__(self, filepath, generation, digest, text):
+        self.filepath = filepath
+        self.generation = generation
+        self.digest = digest
+        self.text = text
+
+def take_snapshot(filepath, force=False):
+    """
+    Serialize the store for a later write_snapshot(). Returns None if nothing changed since the
+    last save/snapshot written to filepath. Cheap to call often; does no file I/O.
+    """
+    generation = _generation
+    if not force and not is_dirty(filepath):
+        return None
+    entries = _backend.live_entries()
+    return Snapshot(filepath, generation, content_hash(entries), serialize_snapshot(entries))
+
+def write_snapshot(snapshot):
+    """
+    Write a snapshot taken by take_snapshot(). Thread-safe, so it can run in an executor.
+    Unlike save(), this leaves the journal alone: replaying it over a newer snapshot is harmless,
+    and it still holds any writes made after the snapshot was taken.
+    """
+    with _snapshot_lock:
+        saved = _saved.get(snapshot.filepath)
+        if saved is not None and saved[0] > snapshot.generation:
+            # A compaction or save already wrote newer state (and may have truncated the journal)
+            return
+        if saved is None or saved[1] != snapshot.digest or not os.path.exists(snapshot.filepath):
+            write_snapshot_text(snapshot.text, snapshot.filepath)
+            print(f"[BotPrefs] ✅ Checkpointed state to {snapshot.filepath}")
+        _saved[snapshot.filepath] = (snapshot.generation, snapshot.digest)
 
-def load(filepath):
-    """Load from a JSON file, adjusting time-based values."""
-    if not os.path.exists(filepath):
+def saved_hash(filepath):
+    """Content hash of the snapshot last saved to (or loaded from) filepath, or None."""
+    saved = _saved.get(filepath)
+    return saved[1] if saved else None
+
+def has_local_state(filepath):
+    """
+    True if a previous run on this machine journaled to filepath (its journal exists, even if empty).
+    A bare snapshot doesn't count: it may just be a stale copy that came with the checkout.
+    """
+    return os.path.exists(filepath + JOURNAL_SUFFIX)
+
+def load(filepath, journal=True):
+    """Load from a JSON snapshot plus its journal, adjusting time-based values."""
+    if not os.path.exists(filepath) and not has_local_state(filepath):
         print(f"[BotPrefs] ⚠️ No existing file at {filepath}, starting fresh.")
+        if journal:
+            open_journal(filepath)
         return
 
-    global _store
     try:
-        with open(filepath, "r") as f:
-            raw = json.load(f)
-
-        now = time.time()
-        _store = {}
-        for key, entry in raw.items():
-            time_based = entry.get("time_based", False)
-            saved_at = entry.get("saved_at", now)
-            value = entry.get("value")
-
-            # Adjust time-based values
-            if time_based:
-                elapsed = now - saved_at
-                adjusted = max(0, value - elapsed)
-                _store[key] = {
-                    "value": adjusted,
-                    "time_based": True,
-                    "saved_at": now  # reset clock
-                }
-            else:
-                _store[key] = entry
-
-        print(f"[BotPrefs] ✅ Loaded state from {filepath}")
+        with _snapshot_lock:
+            replayed = _backend.load(filepath, journal=journal)
+            _touch()
+            _saved[filepath] = (_generation, content_hash(_backend.live_entries()))
+        print(f"[BotPrefs] ✅ Loaded state from {filepath} (+{replayed} journal records)")
     except Exception as e:
-        print(f"[BotPrefs] ❌ Failed to load: {e}")
\ No newline at end of file
+        print(f"[BotPrefs] ❌ Failed to load: {e}")
+
+def migrate_json(filepath):
+    """Import an existing kringbot_prefs.json into the active backend (e.g. when first switching to sqlite)."""
+    load(filepath, journal=False)
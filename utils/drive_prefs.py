@@ -1,70 +1,47 @@
 import os
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-import io
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from dotenv import load_dotenv
+import gzip
+from utils import storage_backends
 
-SCOPES = [
-    "https://www.googleapis.com/auth/drive",  # Full access
-    "https://www.googleapis.com/auth/drive.metadata.readonly",
-    "https://www.googleapis.com/auth/drive.file"
-]
-SERVICE_ACCOUNT_JSON = os.environ.get("GOOGLE_CREDS_PATH")
-if not SERVICE_ACCOUNT_JSON:
-    raise RuntimeError("Missing GOOGLE_CREDS_PATH for Drive service.")
+PREFS_FILENAME = "kringbot_prefs.json"  # stored gzipped on Drive under the same name
+GZIP_MAGIC = b"\x1f\x8b"
 
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_JSON, scopes=SCOPES
-)
-drive_service = build('drive', 'v3', credentials=credentials)
+_prefs_file_id = None
 
-PREFS_FILENAME = "kringbot_prefs.json"
-
-def _get_folder_id_by_name(folder_name: str):
-    query = f"mimeType = 'application/vnd.google-apps.folder' and name = '{folder_name}' and trashed = false"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    folders = results.get("files", [])
-    if folders:
-        return folders[0]['id']
-    return None
+def _folder_name():
+    folder_name = os.environ.get("BOT_PREFS_FOLDER_ID")
+    if not folder_name:
+        raise RuntimeError("Missing BOT_PREFS_FOLDER_ID in .env")
+    return folder_name
 
-FOLDER_ID = _get_folder_id_by_name(os.environ.get("BOT_PREFS_FOLDER_ID"))
+def _find_prefs_file_id():
+    """Look up (once) the ID of the prefs file; later saves update it in place."""
+    global _prefs_file_id
+    if not _prefs_file_id:
+        _prefs_file_id = storage_backends.blob_store().find(_folder_name(), PREFS_FILENAME)
+    return _prefs_file_id
 
 def upload_to_drive(local_path=PREFS_FILENAME):
-    if not FOLDER_ID:
-        raise RuntimeError("Missing BOT_PREFS_FOLDER_ID in .env")
+    global _prefs_file_id
+    with open(local_path, "rb") as f:
+        payload = gzip.compress(f.read(), mtime=0)
 
-    # Delete any old copy with same name
-    query = f"'{FOLDER_ID}' in parents and name = '{PREFS_FILENAME}' and trashed = false"
-    existing = drive_service.files().list(q=query, fields="files(id)").execute().get("files", [])
-    for file in existing:
-        drive_service.files().delete(fileId=file["id"]).execute()
-
-    # Upload fresh file
-    media = MediaFileUpload(local_path, mimetype='application/json')
-    metadata = {'name': PREFS_FILENAME, 'parents': [FOLDER_ID]}
-    drive_service.files().create(body=metadata, media_body=media).execute()
-    print(f"[DrivePrefs] ✅ Uploaded {PREFS_FILENAME} to Drive.")
+    _prefs_file_id = storage_backends.blob_store().write(
+        _folder_name(), PREFS_FILENAME, payload, "application/gzip", blob_id=_find_prefs_file_id()
+    )
+    print(f"[DrivePrefs] ✅ Uploaded {PREFS_FILENAME} to Drive ({len(payload)} bytes gzipped).")
 
 def download_from_drive(local_path=PREFS_FILENAME):
-    if not FOLDER_ID:
-        raise RuntimeError("Missing BOT_PREFS_FOLDER_ID in .env")
-
-    query = f"'{FOLDER_ID}' in parents and name = '{PREFS_FILENAME}' and trashed = false"
-    results = drive_service.files().list(q=query, fields="files(id)").execute()
-    files = results.get("files", [])
-    if not files:
+    file_id = _find_prefs_file_id()
+    if not file_id:
         print("[DrivePrefs] ⚠️ No prefs file found on Drive.")
         return False
 
-    file_id = files[0]['id']
-    request = drive_service.files().get_media(fileId=file_id)
-    fh = io.FileIO(local_path, 'wb')
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
+    data = storage_backends.blob_store().read(file_id)
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    # Older uploads are plain JSON, so anything else is written as-is
+    with open(local_path, "wb") as f:
+        f.write(data)
 
     print(f"[DrivePrefs] ✅ Downloaded {PREFS_FILENAME} from Drive.")
     return True
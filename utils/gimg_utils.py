@@ -1,20 +1,22 @@
 import os
+import time
 import random
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from dotenv import load_dotenv
-
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-SERVICE_ACCOUNT_JSON = os.environ.get("GOOGLE_CREDS_PATH")
-if not SERVICE_ACCOUNT_JSON:
-    raise RuntimeError("Missing GOOGLE_CREDS_PATH environment variable.")
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_JSON, scopes=SCOPES)
-drive_service = build('drive', 'v3', credentials=credentials)
+import threading
+from utils import storage_backends, warm_cache
+
+# Seconds between polls of the Drive changes feed; new, renamed and removed images are applied in place
+IMAGE_CHANGES_POLL_SECONDS = float(os.environ.get("IMAGE_CHANGES_POLL_SECONDS", 60))
 
 # Caches
 _folder_id_cache = {}      # folder_name → folder_id
 _image_list_cache = {}     # folder_id → list of images
+_image_list_fetched = {}   # folder_id → wall-clock time the listing was fetched
+_listing_lock = threading.Lock()  # one cold listing per folder, however many callers arrive at once
+_image_list_lock = threading.Lock()  # guards in-place edits to cached lists: page filler vs. changes feed
+_pending_changes = {}      # folder_id → feed changes held back until that folder's listing is complete
+_poll_lock = threading.Lock()  # one changes-feed poll at a time; each consumes the token it reads
+_changes_token = None      # Drive changes feed position the cached lists are current as of
+_poller = None
 
 # --- Internal helpers ---
 def _get_folder_id_by_name(folder_name: str):
@@ -23,26 +25,68 @@ def _get_folder_id_by_name(folder_name: str):
     if folder_name in _folder_id_cache:
         return _folder_id_cache[folder_name]
 
-    query = f"mimeType = 'application/vnd.google-apps.folder' and name = '{folder_name}' and trashed = false"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    folders = results.get('files', [])
-
-    if folders:
-        folder_id = folders[0]['id']
+    folder_id = storage_backends.folder_listing().resolve_folder(folder_name)
+    if folder_id:
         _folder_id_cache[folder_name] = folder_id
-        return folder_id
-    return None
+        warm_cache.schedule_save()
+    return folder_id
+
+def _ensure_changes_token():
+    """Mark the feed position before listing, so changes made during the listing are replayed afterwards."""
+    global _changes_token
+    if _changes_token is None:
+        try:
+            _changes_token = storage_backends.folder_listing().changes_start_token()
+        except Exception as e:
+            print(f"[GImg] ⚠️ Could not get a changes token, relying on full re-lists: {e}")
 
 def _load_image_list_for_folder(folder_id: str):
     """List all images inside the given folder ID."""
-    query = f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false"
-    results = drive_service.files().list(
-        q=query,
-        fields="files(id, name)",
-        pageSize=1000
-    ).execute()
+    _ensure_changes_token()
+    images = storage_backends.folder_listing().list_images(folder_id)
+    _image_list_fetched[folder_id] = time.time()
+    warm_cache.schedule_save()
+    return images
+
+def _stream_image_list_for_folder(folder_id: str):
+    """
+    Cache the folder's first non-empty page of images and return it right away; a background
+    thread appends the remaining pages to that same cached list as they arrive.
+    """
+    _ensure_changes_token()
+    pages = storage_backends.folder_listing().iter_image_pages(folder_id)
+    images = []
+    for page in pages:
+        # Drive can hand back an empty page that still has a nextPageToken
+        images.extend(page)
+        if images:
+            break
+    with _image_list_lock:
+        _image_list_fetched.pop(folder_id, None)  # marks the listing as incomplete until every page is in
+        _pending_changes.pop(folder_id, None)
+        _image_list_cache[folder_id] = images
+
+    def fill_remaining_pages():
+        try:
+            for page in pages:
+                with _image_list_lock:
+                    images.extend(page)
+        except Exception as e:
+            # Don't keep serving a truncated list: the next caller starts a fresh listing
+            print(f"[GImg] ⚠️ Listing folder {folder_id} failed after {len(images)} images, dropping it: {e}")
+            with _image_list_lock:
+                _pending_changes.pop(folder_id, None)
+                if _image_list_cache.get(folder_id) is images:
+                    del _image_list_cache[folder_id]
+            return
+        with _image_list_lock:
+            # Changes that arrived mid-listing are applied now that every page is in place
+            _apply_folder_changes(folder_id, images, _pending_changes.pop(folder_id, []))
+            _image_list_fetched[folder_id] = time.time()
+        warm_cache.schedule_save()
 
-    return results.get("files", [])
+    threading.Thread(target=fill_remaining_pages, name="gimg-pages", daemon=True).start()
+    return images
 
 def _get_images_in_folder(folder_name: str):
     """Return cached or freshly loaded list of images for a folder."""
@@ -51,13 +95,18 @@ def _get_images_in_folder(folder_name: str):
         return []
 
     if folder_id not in _image_list_cache:
-        _image_list_cache[folder_id] = _load_image_list_for_folder(folder_id)
+        with _listing_lock:
+            if folder_id not in _image_list_cache:
+                return _stream_image_list_for_folder(folder_id)
 
     return _image_list_cache[folder_id]
 
 # --- Access API ---
 def refresh_folder_cache(folder_name: str) -> bool:
     """Manually re-fetch image list for a folder by name."""
+    # Re-resolve the folder too, in case it was recreated since its ID was cached
+    _folder_id_cache.pop(folder_name.strip().lower(), None)
+    storage_backends.folder_listing().forget_folder(folder_name.strip().lower())
     folder_id = _get_folder_id_by_name(folder_name)
     if not folder_id:
         return False
@@ -84,4 +133,136 @@ def get_named_image_url(folder_name: str, name: str):
     for img in images:
         if name in img['name'].lower():
             return f"https://drive.google.com/uc?id={img['id']}"
-    return None
\ No newline at end of file
+    return None
+
+# --- Change feed ---
+def _apply_changes(changes: list) -> int:
+    """Add, rename or drop images in every cached folder list, in place. Returns the number of edits."""
+    edits = 0
+    with _image_list_lock:
+        for folder_id, images in list(_image_list_cache.items()):
+            if folder_id not in _image_list_fetched:
+                # Still being paged in: an image we'd add here could show up again on a later page
+                _pending_changes.setdefault(folder_id, []).extend(changes)
+                continue
+            edits += _apply_folder_changes(folder_id, images, changes)
+    return edits
+
+def _apply_folder_changes(folder_id: str, images: list, changes: list) -> int:
+    """Apply feed changes to one folder's list; the caller holds _image_list_lock."""
+    edits = 0
+    positions = {img["id"]: i for i, img in enumerate(images)}
+    removed = set()
+    for change in changes:
+        in_folder = change["image"] and not change["removed"] and folder_id in change["parents"]
+        if change["id"] in positions:
+            if not in_folder:
+                removed.add(change["id"])
+            elif images[positions[change["id"]]]["name"] != change["name"]:
+                images[positions[change["id"]]] = {"id": change["id"], "name": change["name"]}
+            else:
+                continue
+        elif in_folder:
+            positions[change["id"]] = len(images)
+            images.append({"id": change["id"], "name": change["name"]})
+        else:
+            continue
+        edits += 1
+    if removed:
+        images[:] = [img for img in images if img["id"] not in removed]
+    return edits
+
+def poll_changes() -> int:
+    """Apply everything that changed on Drive since the last poll. Returns the number of cache edits."""
+    global _changes_token
+    with _poll_lock:
+        if _changes_token is None:
+            _ensure_changes_token()
+            return 0
+
+        try:
+            changes, _changes_token = storage_backends.folder_listing().list_changes(_changes_token)
+        except storage_backends.ChangeTokenExpired:
+            print("[GImg] ⚠️ Changes token expired; re-listing cached folders.")
+            _changes_token = None
+            _reconcile(list(_image_list_cache))
+            return 0
+
+        edits = _apply_changes(changes) if changes else 0
+    if edits:
+        print(f"[GImg] 🔄 Applied {edits} image change(s) from Drive.")
+    if changes:
+        warm_cache.schedule_save()  # persists the new token along with the lists
+    return edits
+
+def _poll_forever(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            poll_changes()
+        except Exception as e:
+            print(f"[GImg] ⚠️ Polling Drive changes failed: {e}")
+
+def start_change_poller(interval: float = IMAGE_CHANGES_POLL_SECONDS):
+    """Keep cached image lists current from the Drive changes feed on a background thread."""
+    global _poller
+    if _poller is None and interval > 0:
+        _poller = threading.Thread(target=_poll_forever, args=(interval,), name="gimg-changes", daemon=True)
+        _poller.start()
+
+# --- Warm cache ---
+def _warm_snapshot():
+    return {
+        "changes_token": _changes_token,
+        "folder_ids": dict(_folder_id_cache),
+        "images": {
+            folder_id: {"fetched_at": _image_list_fetched[folder_id], "files": list(images)}
+            for folder_id, images in list(_image_list_cache.items())
+            if folder_id in _image_list_fetched  # skip listings whose pages are still streaming in
+        }
+    }
+
+warm_cache.register("images", _warm_snapshot)
+
+def _reconcile(folder_ids):
+    # Drive doesn't bump a folder's modifiedTime when files are added to it, so re-list instead
+    for folder_id in folder_ids:
+        try:
+            _image_list_cache[folder_id] = _load_image_list_for_folder(folder_id)
+        except Exception as e:
+            print(f"[GImg] ⚠️ Could not re-list folder {folder_id}, keeping cached list: {e}")
+
+def _catch_up():
+    try:
+        poll_changes()
+    except Exception as e:
+        print(f"[GImg] ⚠️ Could not catch up on Drive changes: {e}")
+
+def warm_start(reconcile: bool = True) -> int:
+    """
+    Restore folder IDs and image lists from the last run, then bring them up to date in the
+    background: from the saved changes token when there is one, otherwise by re-listing.
+    Returns the number of folders restored.
+    """
+    global _changes_token
+    data = warm_cache.load("images") or {}
+    for folder_name, folder_id in data.get("folder_ids", {}).items():
+        _folder_id_cache.setdefault(folder_name, folder_id)
+
+    restored = []
+    for folder_id, entry in data.get("images", {}).items():
+        if folder_id not in _image_list_cache:
+            _image_list_cache[folder_id] = entry["files"]
+            _image_list_fetched[folder_id] = entry.get("fetched_at")
+            restored.append(folder_id)
+
+    if restored:
+        print(f"[GImg] ✅ Restored image lists for {len(restored)} folder(s) from {warm_cache.WARM_CACHE_PATH}")
+        if _changes_token is None:
+            _changes_token = data.get("changes_token")
+        if reconcile:
+            if _changes_token is not None:
+                threading.Thread(target=_catch_up, name="gimg-reconcile", daemon=True).start()
+            else:
+                threading.Thread(target=_reconcile, args=(restored,), name="gimg-reconcile", daemon=True).start()
+    return len(restored)
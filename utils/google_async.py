@@ -0,0 +1,41 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from utils import ask_utils, gimg_utils, drive_prefs
+
+# Awaitable versions of the sheet/image/prefs helpers. gspread and googleapiclient block, so every
+# call that may reach Google runs on a small, bounded thread pool instead of the event loop.
+
+GOOGLE_IO_WORKERS = int(os.environ.get("GOOGLE_IO_WORKERS", 4))
+
+_executor = ThreadPoolExecutor(max_workers=GOOGLE_IO_WORKERS, thread_name_prefix="google-io")
+
+async def run(func, *args, **kwargs):
+    """Run a blocking call on the Google I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+# --- Ask sheet ---
+async def load_ask_sheet(sheet_ask_name: str, key: str, force=False):
+    return await run(ask_utils.load_specified_ask_sheet, sheet_ask_name, key, force=force)
+
+async def load_all_ask_sheets(sheet_ask_name: str):
+    return await run(ask_utils.load_all_ask_sheets, sheet_ask_name)
+
+async def get_substring_response(sheet_ask_name: str, username: str, roles: list[str], question: str):
+    return await run(ask_utils.get_substring_response, sheet_ask_name, username, roles, question)
+
+async def get_responses_for_role(sheet_ask_name: str, roles: list[str], key: str, username: str = None):
+    return await run(ask_utils.get_responses_for_role, sheet_ask_name, roles, key, username=username)
+
+# --- Images ---
+async def refresh_folder_cache(folder_name: str) -> bool:
+    return await run(gimg_utils.refresh_folder_cache, folder_name)
+
+async def get_random_image_url(folder_name: str):
+    return await run(gimg_utils.get_random_image_url, folder_name)
+
+# --- Prefs ---
+async def download_prefs(local_path=drive_prefs.PREFS_FILENAME) -> bool:
+    return await run(drive_prefs.download_from_drive, local_path)
@@ -0,0 +1,126 @@
+import os
+import json
+import threading
+
+# Lazily-built, process-wide Google clients. Nothing here touches the network or the
+# credentials file until a client is first asked for, so importing cogs stays cheap.
+
+DRIVE_SCOPES = [
+    "https://www.googleapis.com/auth/drive",  # Full access
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+    "https://www.googleapis.com/auth/drive.file"
+]
+SHEETS_SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
+FOLDER_ID_CACHE_PATH = os.environ.get("FOLDER_ID_CACHE_PATH", "kringbot_folder_ids.json")
+
+_lock = threading.Lock()
+_service_account_info = None
+_drive_service = None
+_gspread_client = None
+_folder_ids = None  # folder name → folder ID, mirrored to FOLDER_ID_CACHE_PATH
+
+def _load_service_account_info():
+    """Read the service account JSON once; every client is built from the same parsed dict."""
+    global _service_account_info
+    if _service_account_info is None:
+        creds_path = os.environ.get("GOOGLE_CREDS_PATH")
+        if not creds_path:
+            raise RuntimeError("Missing GOOGLE_CREDS_PATH environment variable.")
+        with open(creds_path, "r") as f:
+            _service_account_info = json.load(f)
+    return _service_account_info
+
+def drive():
+    """Shared Drive v3 service. Each request gets its own HTTP object, so it's safe to use from worker threads."""
+    global _drive_service
+    if _drive_service is not None:
+        return _drive_service
+
+    with _lock:
+        if _drive_service is None:
+            import httplib2
+            import google_auth_httplib2
+            from google.oauth2 import service_account
+            from googleapiclient.discovery import build
+            from googleapiclient.http import HttpRequest
+
+            credentials = service_account.Credentials.from_service_account_info(
+                _load_service_account_info(), scopes=DRIVE_SCOPES
+            )
+
+            def build_request(http, *args, **kwargs):
+                new_http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+                return HttpRequest(new_http, *args, **kwargs)
+
+            # static_discovery uses the discovery document bundled with the client library (no fetch)
+            _drive_service = build(
+                "drive", "v3",
+                requestBuilder=build_request,
+                http=google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http()),
+                cache_discovery=False,
+                static_discovery=True
+            )
+    return _drive_service
+
+def gspread_client():
+    """Shared, authorized gspread client."""
+    global _gspread_client
+    if _gspread_client is not None:
+        return _gspread_client
+
+    with _lock:
+        if _gspread_client is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(_load_service_account_info(), SHEETS_SCOPES)
+            _gspread_client = gspread.authorize(creds)
+    return _gspread_client
+
+# --- Folder ID cache ---
+def _folder_id_cache():
+    global _folder_ids
+    if _folder_ids is None:
+        try:
+            with open(FOLDER_ID_CACHE_PATH, "r") as f:
+                _folder_ids = json.load(f)
+        except (OSError, ValueError):
+            _folder_ids = {}
+    return _folder_ids
+
+def _persist_folder_ids():
+    try:
+        tmp_path = f"{FOLDER_ID_CACHE_PATH}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_folder_ids, f, indent=2)
+        os.replace(tmp_path, FOLDER_ID_CACHE_PATH)
+    except OSError as e:
+        print(f"[GoogleClients] ⚠️ Could not persist folder ID cache: {e}")
+
+def resolve_folder_id(folder_name: str):
+    """Return the Drive folder ID for a folder name, from the persisted cache when possible."""
+    if not folder_name:
+        return None
+    cache = _folder_id_cache()
+    if folder_name in cache:
+        return cache[folder_name]
+
+    query = f"mimeType = 'application/vnd.google-apps.folder' and name = '{folder_name}' and trashed = false"
+    folders = drive().files().list(q=query, fields="files(id, name)").execute().get("files", [])
+    if not folders:
+        return None
+
+    with _lock:
+        cache[folder_name] = folders[0]["id"]
+        _persist_folder_ids()
+    return cache[folder_name]
+
+def forget_folder_id(folder_name: str):
+    """Drop a cached folder ID (e.g. after the folder was recreated) so the next lookup hits Drive."""
+    cache = _folder_id_cache()
+    with _lock:
+        if cache.pop(folder_name, None) is not None:
+            _persist_folder_ids()
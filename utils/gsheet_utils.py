@@ -1,43 +1,30 @@
 import os
-import gspread
-from dotenv import load_dotenv
-from oauth2client.service_account import ServiceAccountCredentials
+import time
+import threading
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils import storage_backends, warm_cache
+
+# How long a loaded tab counts as fresh. Stale tabs are still served while one background
+# refresh fetches the new contents, so callers never wait on Google once a tab is cached.
+DEFAULT_TTL_SECONDS = float(os.environ.get("SHEET_CACHE_TTL_SECONDS", 600))
+# Missing or empty tabs are cached too, and retried after a backoff that doubles per empty load
+NEGATIVE_BACKOFF_SECONDS = 30
+NEGATIVE_BACKOFF_MAX_SECONDS = 600
 
 _sheet_cache = {}
-CREDS_PATH = os.environ.get("GOOGLE_CREDS_PATH")
-SCOPE = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-]
-# Authenticate using the service account file
-CREDS = ServiceAccountCredentials.from_json_keyfile_name(CREDS_PATH, SCOPE)
-client = gspread.authorize(CREDS)
-
-def _load_from_sheet(sheet_name, tab_name):
-    try:
-        sheet = client.open(sheet_name)
-        return sheet.worksheet(tab_name)
-    except gspread.exceptions.WorksheetNotFound:
-        print(f"[ERROR] Worksheet '{tab_name}' not found in Google Sheet: {sheet_name}")
-        return None
-    except gspread.exceptions.SpreadsheetNotFound:
-        print(f"[ERROR] Sheet '{sheet_name}' not found in Google Drive!")
-        return None
+_cache_meta = {}  # cache key → {"loaded_at", "ttl", "failures", "retry_at", "spec", "version"}
+_cache_version = 0  # bumped whenever any cached tab is replaced
 
-def load_generic_table(sheet_name: str, tab_name: str, num_key_columns: int = 1, num_value_columns: int = None) -> dict:
-    """Load a table from any sheet and tab dynamically."""
-    # If it's already cached, return it.
-    cache_key = f"{sheet_name}:{tab_name}"
-    # if cache_key in _sheet_cache and _sheet_cache[cache_key]:
-    #     return _sheet_cache[cache_key]
+_inflight_lock = threading.Lock()
+_inflight = {}  # cache key → Future of the load every concurrent caller waits on
 
-    # If not cached, load from the sheet.
-    worksheet = _load_from_sheet(sheet_name, tab_name)
-    if not worksheet:
-        return {}
+_refresh_lock = threading.Lock()
+_refreshing = set()  # cache keys with a background refresh in flight
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sheet-refresh")
 
-    rows = worksheet.get_all_values()[1:]  # Skip the header row.
+def _parse_table(rows, num_key_columns: int = 1, num_value_columns: int = None) -> dict:
+    """Turn raw rows (header excluded) into the key → values shape the cogs read."""
     result = defaultdict(list)
 
     for row in rows:
@@ -57,14 +44,193 @@ def load_generic_table(sheet_name: str, tab_name: str, num_key_columns: int = 1,
             result[keys[0]].extend(values)  # Single key → multi-value
         else:
             result[keys] = values  # Multi-key → multi-value
+    return result
 
-    _sheet_cache[cache_key] = result  # Store in cache
+def load_generic_table(sheet_name: str, tab_name: str, num_key_columns: int = 1, num_value_columns: int = None) -> dict:
+    """Load a table from any sheet and tab dynamically."""
+    # If it's already cached, return it.
+    cache_key = f"{sheet_name}:{tab_name}"
+    # if cache_key in _sheet_cache and _sheet_cache[cache_key]:
+    #     return _sheet_cache[cache_key]
+
+    # If not cached, load from the sheet.
+    table = storage_backends.tabular()
+    version = table.get_version(sheet_name)  # read first, so an edit during the download isn't missed later
+    if _unchanged(cache_key, version):
+        # Nobody edited the spreadsheet since the cached copy was taken; skip the download and parse
+        _cache_meta[cache_key]["loaded_at"] = time.monotonic()
+        return _sheet_cache[cache_key]
+
+    rows = table.get_values(sheet_name, tab_name)
+    result = _parse_table(rows[1:], num_key_columns, num_value_columns) if rows else {}  # Skip the header row.
+    _store(cache_key, result, spec=(num_key_columns, num_value_columns), version=version)
     return result
 
-def try_get_from_cache(sheet_name: str, tab_name: str, num_key_columns: int = 1, num_value_columns: int = None, force: bool = False):
+def load_tables(sheet_name: str, table_specs: dict, ttls: dict = None) -> dict:
+    """
+    Load several tabs of one sheet in a single batch and cache each of them.
+    table_specs maps tab_name → (num_key_columns, num_value_columns); returns tab_name → table.
+    ttls optionally maps tab_name → seconds the cached tab stays fresh.
+    """
+    table = storage_backends.tabular()
+    version = table.get_version(sheet_name)
+    cache_keys = [f"{sheet_name}:{tab_name}" for tab_name in table_specs]
+    if all(_unchanged(cache_key, version) for cache_key in cache_keys):
+        now = time.monotonic()
+        for cache_key in cache_keys:
+            _cache_meta[cache_key]["loaded_at"] = now
+        return {tab_name: _sheet_cache[cache_key] for tab_name, cache_key in zip(table_specs, cache_keys)}
+
+    rows_by_tab = table.batch_get_values(sheet_name, list(table_specs))
+    results = {}
+    for tab_name, (num_key_columns, num_value_columns) in table_specs.items():
+        rows = rows_by_tab.get(tab_name)
+        result = _parse_table(rows[1:], num_key_columns, num_value_columns) if rows else {}  # Skip the header row.
+        _store(f"{sheet_name}:{tab_name}", result, (ttls or {}).get(tab_name),
+               spec=(num_key_columns, num_value_columns), version=version)
+        results[tab_name] = result
+    return results
+
+def _store(cache_key: str, result: dict, ttl: float = None, spec: tuple = None, version: str = None):
+    global _cache_version
+    meta = _cache_meta.get(cache_key, {})
+    if ttl is None:
+        ttl = meta.get("ttl", DEFAULT_TTL_SECONDS)
+    now = time.monotonic()
+    failures = 0 if result else meta.get("failures", 0) + 1
+    retry_at = None
+    if failures:
+        backoff = min(NEGATIVE_BACKOFF_SECONDS * 2 ** (failures - 1), NEGATIVE_BACKOFF_MAX_SECONDS)
+        retry_at = now + backoff
+        print(f"[GSheet] ⚠️ {cache_key} is missing or empty; retrying in {int(backoff)}s")
+    _sheet_cache[cache_key] = result
+    _cache_meta[cache_key] = {
+        "loaded_at": now, "ttl": ttl, "failures": failures, "retry_at": retry_at,
+        "spec": spec or meta.get("spec"), "version": version
+    }
+    _cache_version += 1
+    warm_cache.schedule_save()
+
+def _unchanged(cache_key: str, version: str) -> bool:
+    """True if a non-empty cached copy was taken at this same spreadsheet version."""
+    meta = _cache_meta.get(cache_key)
+    return version is not None and bool(_sheet_cache.get(cache_key)) and meta is not None \
+        and meta.get("version") == version
+
+def _backing_off(cache_key: str) -> bool:
+    retry_at = _cache_meta.get(cache_key, {}).get("retry_at")
+    return retry_at is not None and time.monotonic() < retry_at
+
+def _load_single_flight(sheet_name, tab_name, num_key_columns, num_value_columns):
+    """Load a tab, or wait on the load another caller already has in flight for it."""
+    cache_key = f"{sheet_name}:{tab_name}"
+    with _inflight_lock:
+        future = _inflight.get(cache_key)
+        leader = future is None
+        if leader:
+            future = _inflight[cache_key] = Future()
+    if not leader:
+        return future.result()
+
+    try:
+        result = load_generic_table(sheet_name, tab_name, num_key_columns, num_value_columns)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(cache_key, None)
+
+def is_stale(sheet_name: str, tab_name: str) -> bool:
+    meta = _cache_meta.get(f"{sheet_name}:{tab_name}")
+    return meta is None or time.monotonic() - meta["loaded_at"] >= meta["ttl"]
+
+def get_cache_version() -> int:
+    """Changes whenever a cached tab is replaced, so derived caches know to rebuild."""
+    return _cache_version
+
+def _refresh_in_background(sheet_name, tab_name, num_key_columns, num_value_columns):
+    cache_key = f"{sheet_name}:{tab_name}"
+    with _refresh_lock:
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+
+    def refresh():
+        try:
+            _load_single_flight(sheet_name, tab_name, num_key_columns, num_value_columns)
+        except Exception as e:
+            print(f"[GSheet] ⚠️ Background refresh of {cache_key} failed, keeping stale copy: {e}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(cache_key)
+
+    _refresh_executor.submit(refresh)
+
+def try_get_from_cache(sheet_name: str, tab_name: str, num_key_columns: int = 1, num_value_columns: int = None,
+                       force: bool = False, ttl: float = None):
     cache_key = f"{sheet_name}:{tab_name}"
-    # Check if the cache is already populated
-    if force or cache_key not in _sheet_cache or not _sheet_cache[cache_key]:
-        # Load data if cache is empty or force refresh
-        _sheet_cache[cache_key] = load_generic_table(sheet_name, tab_name, num_key_columns, num_value_columns)
+    if ttl is not None:
+        _cache_meta.setdefault(cache_key, {"loaded_at": float("-inf"), "ttl": ttl})["ttl"] = ttl
+
+    # Load synchronously only when forced or when there's nothing usable to serve yet.
+    # A tab known to be missing/empty is served as {} until its backoff runs out.
+    cached = _sheet_cache.get(cache_key)
+    if force or cached is None or (not cached and not _backing_off(cache_key)):
+        return _load_single_flight(sheet_name, tab_name, num_key_columns, num_value_columns)
+    if cached and is_stale(sheet_name, tab_name):
+        # Serve the stale copy now; one background task swaps in the fresh one
+        _refresh_in_background(sheet_name, tab_name, num_key_columns, num_value_columns)
     return _sheet_cache[cache_key]
+
+
+# --- Warm cache ---
+def _warm_snapshot():
+    """Non-empty tabs in a JSON-able form; multi-column keys are stored as lists."""
+    snapshot = []
+    for cache_key, result in list(_sheet_cache.items()):
+        meta = _cache_meta.get(cache_key, {})
+        if not result or not meta.get("spec"):
+            continue
+        sheet_name, tab_name = cache_key.split(":", 1)
+        snapshot.append({
+            "sheet": sheet_name,
+            "tab": tab_name,
+            "spec": list(meta["spec"]),
+            "ttl": meta["ttl"],
+            "version": meta.get("version"),
+            "rows": [[list(key) if isinstance(key, tuple) else key, values] for key, values in result.items()]
+        })
+    return snapshot
+
+warm_cache.register("sheets", _warm_snapshot)
+
+def warm_start(reconcile: bool = True) -> int:
+    """
+    Fill the cache from the last persisted copy. Restored tabs count as stale, so they're served
+    right away while a background refresh checks them against Google. Returns the number restored.
+    """
+    global _cache_version
+    restored = 0
+    for entry in warm_cache.load("sheets") or []:
+        cache_key = f"{entry['sheet']}:{entry['tab']}"
+        if cache_key in _sheet_cache:
+            continue
+        result = defaultdict(list)
+        for key, values in entry["rows"]:
+            result[tuple(key) if isinstance(key, list) else key] = values
+        _sheet_cache[cache_key] = result
+        _cache_meta[cache_key] = {
+            "loaded_at": float("-inf"), "ttl": entry["ttl"], "failures": 0, "retry_at": None,
+            "spec": tuple(entry["spec"]), "version": entry.get("version")
+        }
+        restored += 1
+        if reconcile:
+            _refresh_in_background(entry["sheet"], entry["tab"], *entry["spec"])
+    if restored:
+        _cache_version += 1
+        print(f"[GSheet] ✅ Restored {restored} cached tab(s) from {warm_cache.WARM_CACHE_PATH}")
+    return restored
@@ -0,0 +1,143 @@
+import os
+import csv
+import json
+import random
+import itertools
+import time
+from utils.storage_backends import BlobStore, FolderListing, TabularSheet, ChangeTokenExpired
+
+# Offline stand-ins for Drive and Sheets, backed by a directory:
+#
+#   <root>/blobs/<folder name>/<blob name>       raw blob bytes
+#   <root>/folders/<folder name>.json            [{"id": ..., "name": ...}, ...] image listing
+#   <root>/sheets/<sheet name>/<tab name>.csv    one CSV per tab, header row included
+#
+# Every call sleeps for `latency` seconds (± `jitter`), so cache hit rates and cold starts
+# can be measured against something that behaves like a slow remote service.
+
+class _LocalBase:
+    def __init__(self, root: str, latency: float = 0.0, jitter: float = 0.0):
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0  # round-trips served, for benchmarks
+
+    def _round_trip(self):
+        self.calls += 1
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LocalBlobStore(_LocalBase, BlobStore):
+    def _path(self, folder_name, name):
+        return os.path.join(self.root, "blobs", folder_name, name)
+
+    def find(self, folder_name, name):
+        self._round_trip()
+        path = self._path(folder_name, name)
+        return path if os.path.exists(path) else None
+
+    def read(self, blob_id):
+        self._round_trip()
+        with open(blob_id, "rb") as f:
+            return f.read()
+
+    def write(self, folder_name, name, data, mimetype, blob_id=None):
+        self._round_trip()
+        path = blob_id or self._path(folder_name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+class LocalFolderListing(_LocalBase, FolderListing):
+    def __init__(self, root: str, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__(root, latency, jitter)
+        self._change_snapshots = {}  # changes token → {file ID: (folder, name)} when it was issued
+        self._token_ids = itertools.count(1)  # never reused, even after a token is consumed
+
+    def _path(self, folder_name):
+        return os.path.join(self.root, "folders", f"{folder_name}.json")
+
+    def _all_files(self):
+        files = {}
+        folders_dir = os.path.join(self.root, "folders")
+        if os.path.isdir(folders_dir):
+            for entry in os.scandir(folders_dir):
+                if entry.name.endswith(".json"):
+                    with open(entry.path, "r") as f:
+                        for image in json.load(f):
+                            files[image["id"]] = (entry.name[:-len(".json")], image["name"])
+        return files
+
+    def _issue_token(self, files):
+        token = str(next(self._token_ids))
+        self._change_snapshots[token] = files
+        return token
+
+    def changes_start_token(self):
+        # The change feed is simulated by diffing the folder files against a snapshot per token
+        self._round_trip()
+        return self._issue_token(self._all_files())
+
+    def list_changes(self, token):
+        self._round_trip()
+        if token not in self._change_snapshots:
+            raise ChangeTokenExpired(token)
+        before, now = self._change_snapshots.pop(token), self._all_files()
+        changes = []
+        for file_id in before.keys() | now.keys():
+            if before.get(file_id) == now.get(file_id):
+                continue
+            if file_id in now:
+                folder, name = now[file_id]
+                changes.append({"id": file_id, "name": name, "parents": [folder], "image": True, "removed": False})
+            else:
+                changes.append({"id": file_id, "name": None, "parents": [], "image": False, "removed": True})
+        return changes, self._issue_token(now)
+
+    def resolve_folder(self, folder_name):
+        self._round_trip()
+        return folder_name if os.path.exists(self._path(folder_name)) else None
+
+    page_size = 1000
+
+    def iter_image_pages(self, folder_id):
+        with open(self._path(folder_id), "r") as f:
+            images = json.load(f)
+        # One round-trip per page, like Drive's paginated files().list
+        for start in range(0, max(len(images), 1), self.page_size):
+            self._round_trip()
+            yield images[start:start + self.page_size]
+
+
+class LocalSheetTable(_LocalBase, TabularSheet):
+    def _path(self, sheet_name, tab_name):
+        return os.path.join(self.root, "sheets", sheet_name, f"{tab_name}.csv")
+
+    def _read_tab(self, sheet_name, tab_name):
+        path = self._path(sheet_name, tab_name)
+        if not os.path.exists(path):
+            print(f"[ERROR] Worksheet '{tab_name}' not found in local sheet: {sheet_name}")
+            return None
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            return [row for row in csv.reader(f)]
+
+    def get_values(self, sheet_name, tab_name):
+        self._round_trip()
+        return self._read_tab(sheet_name, tab_name)
+
+    def batch_get_values(self, sheet_name, tab_names):
+        self._round_trip()
+        return {tab_name: self._read_tab(sheet_name, tab_name) for tab_name in tab_names}
+
+    def get_version(self, sheet_name):
+        # Newest tab file mtime (plus the tab count, to catch deletions) stands in for modifiedTime
+        self._round_trip()
+        sheet_dir = os.path.join(self.root, "sheets", sheet_name)
+        if not os.path.isdir(sheet_dir):
+            return None
+        mtimes = [entry.stat().st_mtime_ns for entry in os.scandir(sheet_dir) if entry.name.endswith(".csv")]
+        return f"{max(mtimes)}:{len(mtimes)}" if mtimes else None
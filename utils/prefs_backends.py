@@ -0,0 +1,525 @@
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+JOURNAL_SUFFIX = ".log"   # journal lives next to the snapshot, e.g. kringbot_prefs.json.log
+COMPACT_EVERY = 1000      # journal records before they're folded into the snapshot
+
+# --- Snapshot helpers (the kringbot_prefs.json format) ---
+def serialize_snapshot(entries: dict) -> str:
+    return json.dumps(entries, indent=2)
+
+def write_snapshot_text(text: str, filepath: str):
+    """Atomically replace filepath with an already-serialized snapshot (safe to call from any thread)."""
+    tmp_path = f"{filepath}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, filepath)
+
+def write_snapshot(entries: dict, filepath: str):
+    """Atomically write entries as a JSON snapshot."""
+    write_snapshot_text(serialize_snapshot(entries), filepath)
+
+def read_snapshot(filepath: str) -> dict:
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+def content_hash(entries: dict) -> str:
+    """
+    Hash of a snapshot's meaning rather than its bytes: time-based entries contribute their
+    deadline, so re-exporting the same cooldowns a few seconds later hashes the same.
+    """
+    canonical = {
+        key: ["t", round(entry["saved_at"] + entry["value"], 3)] if entry.get("time_based") else ["v", entry.get("value")]
+        for key, entry in entries.items()
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def rebase_entry(entry: dict, now: float) -> dict:
+    """Return a time-based entry with its remaining value measured from `now`."""
+    if not entry.get("time_based"):
+        return entry
+    saved_at = entry.get("saved_at") or now
+    return {
+        "value": max(0, entry.get("value", 0) - (now - saved_at)),
+        "time_based": True,
+        "saved_at": now
+    }
+
+
+class KeySpace:
+    """
+    Maps (namespace, subject_id) pairs to the flat keys the store has always used,
+    e.g. ("ktoken_balance", 123) ↔ "ktoken_balance_123" and ("deleted", 456) ↔ "456_deleted".
+    """
+    DEFAULT_FORMAT = "{ns}_{sid}"
+
+    def __init__(self, formats: dict = None):
+        self._formats = {}
+        self._affixes = []  # (prefix, suffix, namespace), most specific first
+        for namespace, key_format in (formats or {}).items():
+            self.register(namespace, key_format)
+
+    def register(self, namespace: str, key_format: str = None):
+        key_format = key_format or self.DEFAULT_FORMAT
+        prefix, suffix = key_format.replace("{ns}", namespace).split("{sid}")
+        self._formats[namespace] = key_format
+        self._affixes = [a for a in self._affixes if a[2] != namespace] + [(prefix, suffix, namespace)]
+        self._affixes.sort(key=lambda a: len(a[0]) + len(a[1]), reverse=True)
+
+    def namespaces(self):
+        return list(self._formats.keys())
+
+    def __contains__(self, namespace):
+        return namespace in self._formats
+
+    def join(self, namespace: str, subject_id) -> str:
+        key_format = self._formats.get(namespace, self.DEFAULT_FORMAT)
+        return key_format.format(ns=namespace, sid=subject_id)
+
+    def split(self, key: str):
+        """Return (namespace, subject_id) for a key in a registered namespace, else None."""
+        for prefix, suffix, namespace in self._affixes:
+            if key.startswith(prefix) and key.endswith(suffix) and len(key) > len(prefix) + len(suffix):
+                return namespace, key[len(prefix):len(key) - len(suffix)]
+        return None
+
+
+class MemoryBackend:
+    """Dict-backed store persisted as a JSON snapshot plus an append-only journal."""
+    name = "memory"
+
+    def __init__(self, keyspace: KeySpace = None):
+        self.keyspace = keyspace or KeySpace()
+        self._store = {}
+        self._ns_index = defaultdict(dict)       # namespace → {subject_id: key}
+        self._subject_index = defaultdict(dict)  # subject_id → {namespace: key}
+        self._expiry_heap = []                   # (deadline, key); stale items are skipped when popped
+        self._journal = None
+        self._snapshot_path = None
+        self._journal_records = 0
+        # When set, compact() calls compact_hook(snapshot_path) instead of saving directly, so the
+        # owner can serialize and record the snapshot write; bot_prefs installs one.
+        self.compact_hook = None
+
+    # --- Entry access ---
+    def get_entry(self, key):
+        return self._store.get(key)
+
+    def put_entry(self, key, entry, ns=None):
+        self._append_journal(self._put(key, entry, ns))
+
+    def delete(self, key) -> bool:
+        record = self._delete(key)
+        if record is None:
+            return False
+        self._append_journal(record)
+        return True
+
+    def apply_batch(self, ops):
+        """Apply ("s", key, entry, ns) / ("d", key) ops as one journal record, so replay is all-or-nothing."""
+        records = []
+        for op in ops:
+            record = self._put(*op[1:]) if op[0] == "s" else self._delete(op[1])
+            if record is not None:
+                records.append(record)
+        if records:
+            self._append_journal(["b", records])
+
+    def _put(self, key, entry, ns=None):
+        if key not in self._store:
+            self._index(key, ns)
+        self._store[key] = entry
+        if entry.get("time_based"):
+            heapq.heappush(self._expiry_heap, (entry["saved_at"] + entry["value"], key))
+        return ["s", key, entry["value"], entry["time_based"], entry["saved_at"]]
+
+    def _delete(self, key):
+        if self._store.pop(key, None) is None:
+            return None
+        self._unindex(key)
+        return ["d", key]
+
+    def has(self, key) -> bool:
+        return key in self._store
+
+    def keys(self):
+        return list(self._store.keys())
+
+    def entries(self) -> dict:
+        return dict(self._store)
+
+    def namespace_entries(self, namespace) -> dict:
+        return {sid: self._store[key] for sid, key in self._ns_index.get(namespace, {}).items()}
+
+    def subject_entries(self, subject_id) -> dict:
+        return {ns: self._store[key] for ns, key in self._subject_index.get(str(subject_id), {}).items()}
+
+    def has_durable_state(self) -> bool:
+        return False
+
+    # --- Namespace index ---
+    def _index(self, key, ns=None):
+        ns = ns or self.keyspace.split(key)
+        if ns:
+            namespace, sid = ns[0], str(ns[1])
+            self._ns_index[namespace][sid] = key
+            self._subject_index[sid][namespace] = key
+
+    def _unindex(self, key):
+        ns = self.keyspace.split(key)
+        if ns:
+            namespace, sid = ns[0], str(ns[1])
+            self._ns_index[namespace].pop(sid, None)
+            if not self._ns_index[namespace]:
+                del self._ns_index[namespace]
+            self._subject_index[sid].pop(namespace, None)
+            if not self._subject_index[sid]:
+                del self._subject_index[sid]
+
+    def reindex(self):
+        self._ns_index.clear()
+        self._subject_index.clear()
+        for key in self._store:
+            self._index(key)
+
+    # --- Expiry ---
+    def _rebuild_expiry_heap(self):
+        self._expiry_heap = [
+            (entry["saved_at"] + entry["value"], key)
+            for key, entry in self._store.items() if entry.get("time_based")
+        ]
+        heapq.heapify(self._expiry_heap)
+
+    def expire_due(self, now) -> list:
+        """Drop time-based entries whose deadline has passed. Returns the evicted keys."""
+        expired = []
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, key = heapq.heappop(heap)
+            entry = self._store.get(key)
+            if not entry or not entry.get("time_based"):
+                continue
+            # The entry may have been re-set since this item was pushed; its newer item is still queued.
+            if entry["saved_at"] + entry["value"] > now:
+                continue
+            self.delete(key)
+            expired.append(key)
+        return expired
+
+    # --- Journal ---
+    def _journal_path_for(self, filepath):
+        return filepath + JOURNAL_SUFFIX
+
+    def _append_journal(self, record):
+        """Append one compact record to the journal, compacting once it grows too long."""
+        if self._journal is None:
+            return
+        try:
+            self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._journal.flush()
+            self._journal_records += 1
+        except Exception as e:
+            print(f"[BotPrefs] ❌ Failed to append to journal: {e}")
+            return
+
+        if self._journal_records >= COMPACT_EVERY:
+            self.compact()
+
+    def _replay_journal(self, filepath):
+        """Apply journal records on top of the store. Returns the number of records applied."""
+        path = self._journal_path_for(filepath)
+        if not os.path.exists(path):
+            return 0
+
+        applied = 0
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact.
+                    break
+                for sub_record in (record[1] if record[0] == "b" else [record]):
+                    if sub_record[0] == "s":
+                        _, key, value, time_based, saved_at = sub_record
+                        self._store[key] = {"value": value, "time_based": time_based, "saved_at": saved_at}
+                    elif sub_record[0] == "d":
+                        self._store.pop(sub_record[1], None)
+                applied += 1
+        return applied
+
+    def open_journal(self, filepath, truncate=True):
+        self.close_journal()
+        try:
+            self._journal = open(self._journal_path_for(filepath), "w" if truncate else "a")
+            self._snapshot_path = filepath
+            self._journal_records = 0
+        except Exception as e:
+            self._journal = None
+            print(f"[BotPrefs] ❌ Failed to open journal: {e}")
+
+    def close_journal(self):
+        if self._journal is not None:
+            try:
+                self._journal.close()
+            except Exception:
+                pass
+        self._journal = None
+
+    def compact(self):
+        if self._snapshot_path is None:
+            return
+        if self.compact_hook is not None:
+            self.compact_hook(self._snapshot_path)
+        else:
+            self.save(self._snapshot_path)
+
+    # --- Persistence ---
+    def live_entries(self) -> dict:
+        """Entries worth persisting: everything except time-based entries that have already elapsed."""
+        now = time.time()
+        return {
+            key: entry for key, entry in self._store.items()
+            if not entry.get("time_based") or entry["saved_at"] + entry["value"] > now
+        }
+
+    def save(self, filepath, entries=None):
+        write_snapshot(self.live_entries() if entries is None else entries, filepath)
+        if self._journal is not None and filepath == self._snapshot_path:
+            self._journal.seek(0)
+            self._journal.truncate()
+            self._journal_records = 0
+
+    def load(self, filepath, journal=True) -> int:
+        """Replace the store with snapshot + journal. Returns the number of replayed journal records."""
+        raw = read_snapshot(filepath) if os.path.exists(filepath) else {}
+        now = time.time()
+        self._store = dict(raw)
+        replayed = self._replay_journal(filepath)
+        for key, entry in list(self._store.items()):
+            entry = rebase_entry(entry, now)
+            if entry.get("time_based") and entry["value"] <= 0:
+                del self._store[key]  # elapsed cooldowns aren't worth carrying forward
+            else:
+                self._store[key] = entry
+        self.reindex()
+        self._rebuild_expiry_heap()
+
+        if journal:
+            # Fold the replayed records into a fresh snapshot so the journal starts empty.
+            self.open_journal(filepath, truncate=False)
+            self.compact()
+        return replayed
+
+    def close(self):
+        self.close_journal()
+
+
+class SqliteBackend:
+    """
+    One row per key in an embedded SQLite database (WAL mode).
+    Time-based entries are stored with an absolute `expires_at`, so nothing needs
+    rebasing on restart and the database itself is the durable state.
+    """
+    name = "sqlite"
+
+    def __init__(self, db_path: str, keyspace: KeySpace = None):
+        self.db_path = db_path
+        self.keyspace = keyspace or KeySpace()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prefs ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " time_based INTEGER NOT NULL DEFAULT 0,"
+            " expires_at REAL,"
+            " namespace TEXT,"
+            " subject_id TEXT"
+            ")"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(prefs)")}
+        if "namespace" not in columns:
+            # Databases created before namespaces existed
+            self._conn.execute("ALTER TABLE prefs ADD COLUMN namespace TEXT")
+            self._conn.execute("ALTER TABLE prefs ADD COLUMN subject_id TEXT")
+            self.reindex()
+        self._conn.execute("CREATE INDEX IF NOT EXISTS prefs_ns ON prefs (namespace, subject_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS prefs_subject ON prefs (subject_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS prefs_expiry ON prefs (expires_at) WHERE time_based = 1")
+
+    def _row_to_entry(self, row, now):
+        value, time_based, expires_at = row
+        value = json.loads(value)
+        if time_based:
+            return {"value": max(0, expires_at - now), "time_based": True, "saved_at": now}
+        return {"value": value, "time_based": False, "saved_at": None}
+
+    def _entry_to_row(self, key, entry, ns=None):
+        ns = ns or self.keyspace.split(key) or (None, None)
+        namespace, sid = ns[0], None if ns[1] is None else str(ns[1])
+        if entry.get("time_based"):
+            saved_at = entry.get("saved_at") or time.time()
+            expires_at = saved_at + (entry.get("value") or 0)
+            return (key, json.dumps(entry.get("value")), 1, expires_at, namespace, sid)
+        return (key, json.dumps(entry.get("value")), 0, None, namespace, sid)
+
+    # --- Entry access ---
+    def get_entry(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, time_based, expires_at FROM prefs WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self._row_to_entry(row, time.time())
+
+    def put_entry(self, key, entry, ns=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prefs (key, value, time_based, expires_at, namespace, subject_id)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                self._entry_to_row(key, entry, ns)
+            )
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM prefs WHERE key = ?", (key,))
+        return cur.rowcount > 0
+
+    def apply_batch(self, ops):
+        """Apply ("s", key, entry, ns) / ("d", key) ops in a single SQLite transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for op in ops:
+                    if op[0] == "s":
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO prefs (key, value, time_based, expires_at, namespace, subject_id)"
+                            " VALUES (?, ?, ?, ?, ?, ?)",
+                            self._entry_to_row(*op[1:])
+                        )
+                    else:
+                        self._conn.execute("DELETE FROM prefs WHERE key = ?", (op[1],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def has(self, key) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM prefs WHERE key = ?", (key,)).fetchone() is not None
+
+    def keys(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM prefs")]
+
+    def entries(self) -> dict:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value, time_based, expires_at FROM prefs").fetchall()
+        return {row[0]: self._row_to_entry(row[1:], now) for row in rows}
+
+    def namespace_entries(self, namespace) -> dict:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT subject_id, value, time_based, expires_at FROM prefs WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        return {row[0]: self._row_to_entry(row[1:], now) for row in rows}
+
+    def subject_entries(self, subject_id) -> dict:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, value, time_based, expires_at FROM prefs WHERE subject_id = ?", (str(subject_id),)
+            ).fetchall()
+        return {row[0]: self._row_to_entry(row[1:], now) for row in rows}
+
+    def has_durable_state(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM prefs LIMIT 1").fetchone() is not None
+
+    def expire_due(self, now) -> list:
+        """Drop time-based rows whose expires_at has passed. Returns the evicted keys."""
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT key FROM prefs WHERE time_based = 1 AND expires_at <= ?", (now,)
+            )]
+            if keys:
+                self._conn.execute("DELETE FROM prefs WHERE time_based = 1 AND expires_at <= ?", (now,))
+        return keys
+
+    def reindex(self):
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM prefs")]
+            updates = []
+            for key in keys:
+                namespace, sid = self.keyspace.split(key) or (None, None)
+                updates.append((namespace, sid, key))
+            self._conn.executemany("UPDATE prefs SET namespace = ?, subject_id = ? WHERE key = ?", updates)
+
+    # --- Journal (WAL already gives us one) ---
+    def open_journal(self, filepath, truncate=True):
+        pass
+
+    def close_journal(self):
+        pass
+
+    def compact(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # --- Persistence ---
+    def live_entries(self) -> dict:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, time_based, expires_at FROM prefs WHERE time_based = 0 OR expires_at > ?", (now,)
+            ).fetchall()
+        return {row[0]: self._row_to_entry(row[1:], now) for row in rows}
+
+    def save(self, filepath, entries=None):
+        """Export the database as a kringbot_prefs.json snapshot (used for the Drive backup)."""
+        write_snapshot(self.live_entries() if entries is None else entries, filepath)
+
+    def load(self, filepath, journal=True) -> int:
+        """Replace the database contents with a kringbot_prefs.json snapshot (and its journal, if any)."""
+        staging = MemoryBackend(self.keyspace)
+        replayed = staging.load(filepath, journal=False)
+        rows = [self._entry_to_row(key, entry) for key, entry in staging.entries().items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM prefs")
+                self._conn.executemany(
+                    "INSERT INTO prefs (key, value, time_based, expires_at, namespace, subject_id)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return replayed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> int:
+    """One-off migration of an existing kringbot_prefs.json into a SQLite database. Returns the row count."""
+    backend = SqliteBackend(db_path)
+    try:
+        backend.load(json_path, journal=False)
+        return len(backend.keys())
+    finally:
+        backend.close()
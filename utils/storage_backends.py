@@ -0,0 +1,341 @@
+import os
+import io
+import threading
+from utils import google_clients
+
+# "google" talks to Drive/Sheets; "local" serves everything from a directory (see utils/local_storage.py)
+STORAGE_BACKEND = os.environ.get("KRINGBOT_STORAGE", "google").strip().lower()
+LOCAL_STORAGE_DIR = os.environ.get("KRINGBOT_LOCAL_STORAGE_DIR", "local_storage")
+LOCAL_LATENCY_MS = float(os.environ.get("KRINGBOT_LOCAL_LATENCY_MS", 0))
+
+IMAGE_PAGE_SIZE = 1000                  # Drive's maximum files().list page size
+UPLOAD_CHUNK_SIZE = 1024 * 1024         # must be a multiple of 256 KiB
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024   # payloads above this use a chunked resumable upload
+
+
+### Interfaces ###
+class ChangeTokenExpired(Exception):
+    """The saved changes token is no longer accepted; callers must re-list and start over."""
+    pass
+
+
+class BlobStore:
+    """Named binary blobs inside a named folder."""
+    def find(self, folder_name: str, name: str):
+        """Return the blob ID of `name` in the folder, or None."""
+        raise NotImplementedError
+
+    def read(self, blob_id: str) -> bytes:
+        raise NotImplementedError
+
+    def write(self, folder_name: str, name: str, data: bytes, mimetype: str, blob_id: str = None) -> str:
+        """Create the blob, or overwrite it in place when blob_id is given. Returns the blob ID."""
+        raise NotImplementedError
+
+
+class FolderListing:
+    """Image listings for named folders."""
+    def resolve_folder(self, folder_name: str):
+        """Return the folder ID for a folder name, or None."""
+        raise NotImplementedError
+
+    def forget_folder(self, folder_name: str):
+        """Drop any cached folder ID so the next resolve looks it up again."""
+        pass
+
+    def list_images(self, folder_id: str) -> list:
+        """Return [{"id": ..., "name": ...}] for the images in a folder."""
+        return [image for page in self.iter_image_pages(folder_id) for image in page]
+
+    def iter_image_pages(self, folder_id: str):
+        """Yield the folder's images a page at a time, fetching each page only when it's asked for."""
+        raise NotImplementedError
+
+    def changes_start_token(self):
+        """Token marking "now" in the change feed, or None if this backend has no change feed."""
+        return None
+
+    def list_changes(self, token: str):
+        """
+        Return (changes, next_token) for everything changed since token. Each change is
+        {"id", "name", "parents", "image", "removed"}; removed covers deleted and trashed files.
+        Raises ChangeTokenExpired if the token is too old.
+        """
+        raise NotImplementedError
+
+
+class TabularSheet:
+    """Tabs of string cells inside a named spreadsheet."""
+    def get_values(self, sheet_name: str, tab_name: str):
+        """Return all rows (header included) as lists of strings, or None if the sheet/tab doesn't exist."""
+        raise NotImplementedError
+
+    def batch_get_values(self, sheet_name: str, tab_names: list) -> dict:
+        """Return {tab_name: rows or None} for several tabs; backends override this to use one round-trip."""
+        return {tab_name: self.get_values(sheet_name, tab_name) for tab_name in tab_names}
+
+    def get_version(self, sheet_name: str):
+        """Return a string that changes whenever the spreadsheet is edited (e.g. its modifiedTime), or None."""
+        return None
+
+
+### Google implementations ###
+class GoogleDriveBlobStore(BlobStore):
+    def find(self, folder_name, name):
+        folder_id = google_clients.resolve_folder_id(folder_name)
+        if not folder_id:
+            return None
+        query = f"'{folder_id}' in parents and name = '{name}' and trashed = false"
+        files = google_clients.drive().files().list(q=query, fields="files(id)").execute().get("files", [])
+        return files[0]["id"] if files else None
+
+    def read(self, blob_id):
+        from googleapiclient.http import MediaIoBaseDownload
+
+        request = google_clients.drive().files().get_media(fileId=blob_id)
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, request)
+        done = False
+        while not done:
+            status, done = downloader.next_chunk()
+        return buffer.getvalue()
+
+    def _send(self, folder_name, name, data, mimetype, blob_id):
+        from googleapiclient.http import MediaIoBaseUpload
+
+        media = MediaIoBaseUpload(
+            io.BytesIO(data),
+            mimetype=mimetype,
+            chunksize=UPLOAD_CHUNK_SIZE,
+            resumable=len(data) > RESUMABLE_THRESHOLD
+        )
+        files = google_clients.drive().files()
+        if blob_id:
+            request = files.update(fileId=blob_id, media_body=media, fields="id")
+        else:
+            metadata = {'name': name, 'parents': [google_clients.resolve_folder_id(folder_name)]}
+            request = files.create(body=metadata, media_body=media, fields="id")
+
+        if not media.resumable():
+            return request.execute()["id"]
+        response = None
+        while response is None:
+            status, response = request.next_chunk()
+        return response["id"]
+
+    def write(self, folder_name, name, data, mimetype, blob_id=None):
+        from googleapiclient.errors import HttpError
+
+        try:
+            return self._send(folder_name, name, data, mimetype, blob_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            if blob_id:
+                # The file was removed on Drive since its ID was cached; create a fresh one
+                return self.write(folder_name, name, data, mimetype)
+            # Creating under the cached folder ID failed: the folder was recreated, so look it up again
+            google_clients.forget_folder_id(folder_name)
+            return self._send(folder_name, name, data, mimetype, None)
+
+
+class GoogleDriveFolderListing(FolderListing):
+    def resolve_folder(self, folder_name):
+        return google_clients.resolve_folder_id(folder_name)
+
+    def forget_folder(self, folder_name):
+        google_clients.forget_folder_id(folder_name)
+
+    def iter_image_pages(self, folder_id):
+        query = f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false"
+        page_token = None
+        while True:
+            results = google_clients.drive().files().list(
+                q=query,
+                fields="nextPageToken, files(id, name)",
+                pageSize=IMAGE_PAGE_SIZE,
+                pageToken=page_token
+            ).execute()
+            yield results.get("files", [])
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return
+
+    def changes_start_token(self):
+        return google_clients.drive().changes().getStartPageToken().execute()["startPageToken"]
+
+    def list_changes(self, token):
+        from googleapiclient.errors import HttpError
+
+        changes = []
+        page_token = token
+        while True:
+            try:
+                results = google_clients.drive().changes().list(
+                    pageToken=page_token,
+                    fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(name, parents, mimeType, trashed))",
+                    pageSize=IMAGE_PAGE_SIZE,
+                    includeRemoved=True,
+                    spaces="drive"
+                ).execute()
+            except HttpError as e:
+                if e.resp.status in (400, 404):
+                    raise ChangeTokenExpired(str(e))
+                raise
+            for change in results.get("changes", []):
+                file = change.get("file") or {}
+                changes.append({
+                    "id": change["fileId"],
+                    "name": file.get("name"),
+                    "parents": file.get("parents", []),
+                    "image": file.get("mimeType", "").startswith("image/"),
+                    "removed": change.get("removed", False) or file.get("trashed", False)
+                })
+            if "newStartPageToken" in results:
+                return changes, results["newStartPageToken"]
+            page_token = results["nextPageToken"]
+
+
+class GoogleSheetsTable(TabularSheet):
+    """
+    Reads tabs straight from the Sheets values endpoint. The spreadsheet is only resolved by name
+    (a Drive search plus a metadata fetch) the first time; the opened spreadsheet and its worksheet
+    IDs are cached until a load finds the spreadsheet or one of its tabs missing.
+    """
+    def __init__(self):
+        self._handles = {}  # sheet name → {"spreadsheet": gspread Spreadsheet, "key": its key, "worksheets": {title: sheet ID}}
+
+    def _handle(self, sheet_name):
+        handle = self._handles.get(sheet_name)
+        if handle is None:
+            spreadsheet = google_clients.gspread_client().open(sheet_name)
+            metadata = spreadsheet.fetch_sheet_metadata()
+            handle = {
+                "spreadsheet": spreadsheet,
+                "key": spreadsheet.id,
+                "worksheets": {
+                    ws["properties"]["title"]: ws["properties"]["sheetId"] for ws in metadata.get("sheets", [])
+                }
+            }
+            self._handles[sheet_name] = handle
+        return handle
+
+    def invalidate(self, sheet_name):
+        self._handles.pop(sheet_name, None)
+
+    def spreadsheet_key(self, sheet_name):
+        """The cached spreadsheet key (its Drive file ID), resolving the sheet by name if needed."""
+        return self._handle(sheet_name)["key"]
+
+    def get_version(self, sheet_name):
+        import gspread
+        from googleapiclient.errors import HttpError
+
+        try:
+            key = self.spreadsheet_key(sheet_name)
+            metadata = google_clients.drive().files().get(fileId=key, fields="modifiedTime").execute()
+        except gspread.exceptions.SpreadsheetNotFound:
+            return None
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            self.invalidate(sheet_name)
+            return None
+        return metadata.get("modifiedTime")
+
+    def _values_batch_get(self, handle, tab_names):
+        from gspread.utils import absolute_range_name
+
+        # The spreadsheet opened when the handle was resolved, so this is the only request per load
+        ranges = [absolute_range_name(tab_name) for tab_name in tab_names]
+        response = handle["spreadsheet"].values_batch_get(ranges)
+        return response.get("valueRanges", [])
+
+    def get_values(self, sheet_name, tab_name):
+        return self.batch_get_values(sheet_name, [tab_name])[tab_name]
+
+    def batch_get_values(self, sheet_name, tab_names, retry=True):
+        """Fetch every tab in a single values:batchGet call against the cached spreadsheet."""
+        import gspread
+        from gspread.utils import fill_gaps
+
+        try:
+            handle = self._handle(sheet_name)
+        except gspread.exceptions.SpreadsheetNotFound:
+            print(f"[ERROR] Sheet '{sheet_name}' not found in Google Drive!")
+            return {tab_name: None for tab_name in tab_names}
+
+        present = [tab_name for tab_name in tab_names if tab_name in handle["worksheets"]]
+        if len(present) < len(tab_names) and retry:
+            # Worksheet not found in the cached metadata; it may have been added since
+            self.invalidate(sheet_name)
+            return self.batch_get_values(sheet_name, tab_names, retry=False)
+
+        results = {}
+        for tab_name in tab_names:
+            if tab_name not in handle["worksheets"]:
+                print(f"[ERROR] Worksheet '{tab_name}' not found in Google Sheet: {sheet_name}")
+                results[tab_name] = None
+        if not present:
+            return results
+
+        try:
+            value_ranges = self._values_batch_get(handle, present)
+        except gspread.exceptions.APIError as e:
+            if not retry or e.response.status_code not in (400, 404):
+                raise
+            # Spreadsheet gone or a tab renamed under us: resolve everything again once
+            self.invalidate(sheet_name)
+            return self.batch_get_values(sheet_name, tab_names, retry=False)
+
+        # Pad ragged rows the same way worksheet.get_all_values() does
+        for tab_name, value_range in zip(present, value_ranges):
+            results[tab_name] = fill_gaps(value_range.get("values", []))
+        return results
+
+
+### Selection ###
+_lock = threading.Lock()
+_backends = {}
+
+def _make(kind):
+    if STORAGE_BACKEND == "local":
+        from utils import local_storage
+        latency = LOCAL_LATENCY_MS / 1000
+        return {
+            "blob": lambda: local_storage.LocalBlobStore(LOCAL_STORAGE_DIR, latency),
+            "folders": lambda: local_storage.LocalFolderListing(LOCAL_STORAGE_DIR, latency),
+            "tabular": lambda: local_storage.LocalSheetTable(LOCAL_STORAGE_DIR, latency),
+        }[kind]()
+    if STORAGE_BACKEND != "google":
+        print(f"[Storage] ⚠️ Unknown storage backend '{STORAGE_BACKEND}', using google.")
+    return {
+        "blob": GoogleDriveBlobStore,
+        "folders": GoogleDriveFolderListing,
+        "tabular": GoogleSheetsTable,
+    }[kind]()
+
+def _get(kind):
+    backend = _backends.get(kind)
+    if backend is None:
+        with _lock:
+            backend = _backends.get(kind)
+            if backend is None:
+                backend = _backends[kind] = _make(kind)
+    return backend
+
+def blob_store() -> BlobStore:
+    return _get("blob")
+
+def folder_listing() -> FolderListing:
+    return _get("folders")
+
+def tabular() -> TabularSheet:
+    return _get("tabular")
+
+def use_backends(blob: BlobStore = None, folders: FolderListing = None, table: TabularSheet = None):
+    """Swap in specific backends (e.g. local stand-ins for a benchmark run)."""
+    with _lock:
+        for kind, backend in (("blob", blob), ("folders", folders), ("tabular", table)):
+            if backend is not None:
+                _backends[kind] = backend
@@ -0,0 +1,54 @@
+from collections import deque
+
+class Automaton:
+    """
+    Aho-Corasick automaton over any sequence of hashable symbols: characters of a string for
+    substring rules, or a list of words for keyword phrases. Built once, then every pattern
+    occurring in a text is found in a single pass over it.
+    """
+    def __init__(self, patterns):
+        """patterns: iterable of (symbols, payload); the payload is reported whenever the symbols occur."""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for symbols, payload in patterns:
+            node = 0
+            for symbol in symbols:
+                child = self._goto[node].get(symbol)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][symbol] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = child
+            self._out[node].append(payload)  # an empty pattern lands on the root and matches any text
+
+        # Breadth-first, so a node's failure target is finished before its children need it
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and symbol not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(symbol, 0)
+                if self._fail[child]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, symbols):
+        """Yield the payload of every pattern occurrence, in order of where each occurrence ends."""
+        yield from self._out[0]
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for symbol in symbols:
+            while node and symbol not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(symbol, 0)
+            if node and out[node]:
+                yield from out[node]
+
+    def matched(self, symbols) -> set:
+        """Payloads of every pattern that occurs at least once."""
+        return set(self.iter_matches(symbols))
@@ -0,0 +1,64 @@
+import os
+import json
+import atexit
+import threading
+
+# On-disk copy of the sheet and image-listing caches, so a restart can serve the last known
+# data immediately and reconcile with Google in the background. Each cache module registers
+# a section: a callable returning its JSON-able snapshot, read back with load(section).
+
+WARM_CACHE_PATH = os.environ.get("KRINGBOT_WARM_CACHE_PATH", "kringbot_warm_cache.json")
+SAVE_DELAY_SECONDS = 2  # coalesce bursts of cache updates into one write
+FORMAT_VERSION = 1
+
+_lock = threading.Lock()
+_sections = {}  # section name → snapshot callable
+_on_disk = None
+_timer = None
+
+def register(section: str, snapshot):
+    _sections[section] = snapshot
+
+def load(section: str):
+    """Return the persisted data for a section, or None if there isn't any."""
+    global _on_disk
+    if _on_disk is None:
+        try:
+            with open(WARM_CACHE_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            _on_disk = data if data.get("format") == FORMAT_VERSION else {}
+        except (OSError, ValueError):
+            _on_disk = {}
+    return _on_disk.get(section)
+
+def schedule_save():
+    """Write the cache file shortly, folding any further updates in the meantime into the same write."""
+    global _timer
+    with _lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(SAVE_DELAY_SECONDS, save_now)
+        _timer.daemon = True
+        _timer.start()
+
+def save_now():
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+        _timer = None
+        data = {"format": FORMAT_VERSION}
+        try:
+            for section, snapshot in _sections.items():
+                data[section] = snapshot()
+            tmp_path = f"{WARM_CACHE_PATH}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, WARM_CACHE_PATH)
+        except (OSError, TypeError, ValueError, RuntimeError) as e:
+            print(f"[WarmCache] ⚠️ Could not write {WARM_CACHE_PATH}: {e}")
+
+@atexit.register
+def _flush_pending():
+    if _timer is not None:
+        save_now()